@@ -1,7 +1,6 @@
 import inspect
 import sys
-
-from Download import Download
+from getpass import getpass
 
 """
 Main Action Class
@@ -25,27 +24,28 @@ Actions
 """
 
 
-# TODO: Split download features
-
-
 class DownloadBlackboardCourse(Action):
     code = "1"
     name = "Download course files"
-    description = "Download a Blackboard course to your computer."
+    description = "Download the files of a Blackboard course to your computer, without grades and submissions."
 
     @staticmethod
     def action():
-        Download()
+        from Download import Download
+
+        Download(profile="files")
 
 
 class DownloadBlackboardCourseSubmissions(Action):
     code = "2"
     name = "Download course files and submissions"
-    description = "Download a Blackboard course to your computer."
+    description = "Download the files and your submissions of a Blackboard course to your computer."
 
     @staticmethod
     def action():
-        Download()
+        from Download import Download
+
+        Download(profile="submissions")
 
 
 class DownloadBlackboardCourseAll(Action):
@@ -55,7 +55,27 @@ class DownloadBlackboardCourseAll(Action):
 
     @staticmethod
     def action():
-        Download()
+        from Download import Download
+
+        Download(profile="all")
+
+
+class RetryFailedDownloads(Action):
+    code = "4"
+    name = "Retry failed downloads"
+    description = "Download the files that kept failing in earlier runs again."
+
+    @staticmethod
+    def action():
+        import Batch
+
+        username = input("Please type your username and hit [Enter]:\n> ")
+        print()
+        print("Please type your password (not visible) and hit [Enter]:\n")
+        password = getpass("> ")
+        print()
+
+        Batch.retry(username, password)
 
 
 actions = []
@@ -0,0 +1,256 @@
+import io
+import logging
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+
+import Config
+import Utils
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+Archive output, see Config.ARCHIVE. Every course is written to one archive in DOWNLOAD_PATH. Workers only queue the
+finished files; a single writer thread per archive copies them in, so entries are never interleaved, and the bounded
+queue keeps the memory flat. Next to the archive an index in JSON lists the offset and size of every entry, so entries
+can be read back without scanning the archive. A later run moves the archive aside, writes the files it downloaded
+again and then copies the other entries forward, so the archive keeps the unchanged files of earlier runs.
+"""
+
+FORMATS = ["zip", "tar", "tar.zst"]
+
+# already compressed content is stored as is #
+STORED = (".zip", ".7z", ".rar", ".gz", ".mp4", ".mkv", ".avi", ".mov", ".mp3", ".jpg", ".jpeg", ".png", ".docx",
+          ".xlsx", ".pptx")
+
+
+class Archive:
+    """
+    One archive file with its writer thread.
+    """
+
+    def __init__(self, file: str, kind: str = Config.ARCHIVE, size: int = Config.ARCHIVE_QUEUE):
+        if kind not in FORMATS:
+            raise ValueError("Unknown archive format {}, use one of {}".format(kind, ", ".join(FORMATS)))
+        if kind == "tar.zst" and zstandard is None:
+            raise ImportError("The zstandard package is needed for tar.zst archives")
+
+        self.file = file
+        self.kind = kind
+        self.names = set()
+        self.index = {}
+
+        # entries written by an earlier run #
+        self.previous = set()
+        if os.path.isfile(file + ".index.json"):
+            self.previous = set(Utils.data(file=file + ".index.json"))
+
+        self.queue = queue.Queue(maxsize=size)
+        self.thread = threading.Thread(target=self.run, name="archive", daemon=True)
+        self.thread.start()
+
+    def add(self, name: str, file: str = None, data: bytes = None, remove: bool = False):
+        """
+        Queues an entry, waits while the queue is full.
+        :param name: The path in the archive.
+        :param file: A file to copy in.
+        :param data: The content, when there is no file.
+        :param remove: Remove the file once it is in the archive.
+        """
+        self.queue.put((name, file, data, remove))
+
+    def has(self, name: str) -> bool:
+        return name in self.names or name in self.previous
+
+    def unique(self, name: str) -> str:
+        # same name as an earlier entry, e.g. an updated file #
+        if name in self.names:
+            stem, extension = os.path.splitext(name)
+            name = "{}_{}{}".format(stem, len(self.names), extension)
+
+        self.names.add(name)
+
+        return name
+
+    def run(self):
+        Utils.create_folder_if_not_exists(os.path.dirname(self.file))
+
+        previous = self.file + ".old"
+        if os.path.isfile(previous):
+            logging.warning("Earlier run did not finish {}, starting from {}".format(self.file, previous))
+        elif os.path.isfile(self.file):
+            os.replace(self.file, previous)
+
+        stream = open(self.file, mode="wb")
+        compressor = None
+
+        if self.kind == "zip":
+            archive = zipfile.ZipFile(stream, mode="w", allowZip64=True)
+        elif self.kind == "tar":
+            archive = tarfile.open(fileobj=stream, mode="w|")
+        else:
+            compressor = zstandard.ZstdCompressor().stream_writer(stream, closefd=False)
+            archive = tarfile.open(fileobj=compressor, mode="w|")
+
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+
+            name, file, data, remove = entry
+            name = self.unique(name)
+
+            try:
+                if self.kind == "zip":
+                    if file is not None:
+                        info = zipfile.ZipInfo.from_file(file, name)
+                    else:
+                        info = zipfile.ZipInfo(name, time.localtime()[:6])
+                else:
+                    if file is not None:
+                        info = archive.gettarinfo(file, name)
+                    else:
+                        info = tarfile.TarInfo(name)
+                        info.size = len(data)
+                        info.mtime = time.time()
+
+                with open(file, mode="rb") if file is not None else io.BytesIO(data) as source:
+                    self.write(archive, info, source)
+
+                if remove and file is not None:
+                    os.remove(file)
+            except Exception as e:
+                logging.error("Could not add {} to {}: {}".format(name, self.file, e))
+
+        carried = True
+        if os.path.isfile(previous):
+            try:
+                self.carry(archive, previous)
+            except Exception as e:
+                logging.error("Could not copy the entries of {} into {}, kept as is: {}".format(previous, self.file, e))
+                carried = False
+
+        archive.close()
+        if compressor is not None:
+            compressor.close()
+        stream.close()
+
+        Utils.write(self.file + ".index.json", self.index)
+
+        if carried and os.path.isfile(previous):
+            os.remove(previous)
+
+    def carry(self, archive, previous: str):
+        """
+        Copies the entries of the archive of an earlier run that this run did not write again.
+        """
+        if self.kind == "zip":
+            with zipfile.ZipFile(previous) as old:
+                for info in old.infolist():
+                    if info.filename not in self.names:
+                        self.names.add(info.filename)
+
+                        with old.open(info) as source:
+                            self.write(archive, zipfile.ZipInfo(info.filename, info.date_time), source)
+        else:
+            with open(previous, mode="rb") as stream:
+                if self.kind == "tar.zst":
+                    stream = zstandard.ZstdDecompressor().stream_reader(stream)
+
+                with tarfile.open(fileobj=stream, mode="r|") as old:
+                    for info in old:
+                        if info.isfile() and info.name not in self.names:
+                            self.names.add(info.name)
+                            self.write(archive, info, old.extractfile(info))
+
+    def write(self, archive, info, source):
+        if self.kind == "zip":
+            self.write_zip(archive, info, source)
+        else:
+            self.write_tar(archive, info, source)
+
+    def write_zip(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo, source):
+        info.compress_type = zipfile.ZIP_STORED if info.filename.lower().endswith(STORED) else zipfile.ZIP_DEFLATED
+
+        with archive.open(info, mode="w", force_zip64=True) as target:
+            while True:
+                chunk = source.read(Config.CHUNK_MAX)
+                if not chunk:
+                    break
+                target.write(chunk)
+
+        self.index[info.filename] = {"offset": info.header_offset, "size": info.file_size,
+                                     "compressed_size": info.compress_size}
+
+    def write_tar(self, archive: tarfile.TarFile, info: tarfile.TarInfo, source):
+        offset = archive.offset
+
+        archive.addfile(info, source)
+
+        # offsets in the uncompressed tar stream, the data is padded to whole blocks #
+        self.index[info.name] = {"offset": offset,
+                                 "data_offset": archive.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE,
+                                 "size": info.size}
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class Archives:
+    """
+    The archives of all courses, opened when their first entry arrives.
+    """
+
+    def __init__(self):
+        self.archives = {}
+        self.lock = threading.Lock()
+
+    def archive(self, course: str) -> Archive:
+        with self.lock:
+            if course not in self.archives:
+                self.archives[course] = Archive(Config.DOWNLOAD_PATH + course + "." + Config.ARCHIVE, Config.ARCHIVE)
+
+            return self.archives[course]
+
+    def has(self, file: str) -> bool:
+        """
+        Whether a file of the course tree is in the archive of its course, written in this or an earlier run.
+        """
+        name = os.path.relpath(file, Config.DOWNLOAD_PATH).replace("\\", "/")
+
+        return self.archive(name.split("/")[0]).has(name)
+
+    def add_file(self, file: str):
+        """
+        Moves a downloaded file into the archive of its course.
+        """
+        name = os.path.relpath(file, Config.DOWNLOAD_PATH).replace("\\", "/")
+
+        self.archive(name.split("/")[0]).add(name, file=file, remove=True)
+
+    def add_page(self, page: str, html: str):
+        """
+        Adds a cached page to the archive of its course, under [Pages].
+        """
+        name = os.path.relpath(page, Config.CACHE_PATH).replace("\\", "/")
+        course, _, rest = name.partition("/")
+
+        self.archive(course).add(course + "/[Pages]/" + rest, data=html.encode("utf-8"))
+
+    def close(self):
+        with self.lock:
+            archives, self.archives = self.archives, {}
+
+        for archive in archives.values():
+            archive.close()
+            print("Archive written to {}".format(archive.file))
+
+
+archives = Archives()
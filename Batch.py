@@ -0,0 +1,167 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Config
+import Request
+from Download import Download, finish
+from Downloader import Downloader
+from Failed import failed
+from Pool import Pool
+from Session import SessionPool
+
+
+def read_courses(arguments: [str]) -> [str]:
+    """
+    Returns the course links from the arguments. An argument is either a course link or a file with one link per line.
+    """
+    courses = []
+
+    for argument in arguments:
+        if os.path.isfile(argument):
+            with open(argument, mode="r", encoding="utf-8") as f:
+                courses += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        else:
+            courses.append(argument)
+
+    return courses
+
+
+def run(courses: [str], username: str, password: str, workers: int = Config.BATCH_COURSES,
+        profile: str = Config.PROFILE, crawl_only: bool = False) -> []:
+    """
+    Downloads several courses at once. The courses share a few logged in sessions and one download pool.
+    :param crawl_only: Only crawl and cache the pages of the courses, see Download.
+    :return: A summary entry for every course.
+    """
+    sessions = SessionPool(username, password)
+    pool = Pool()
+
+    def course(course_url: str) -> dict:
+        start = time.time()
+        summary = {"course": course_url, "name": None, "pages": 0, "files": 0, "status": "done"}
+
+        try:
+            session = sessions.acquire()
+        except Exception as e:
+            logging.error("Course {} failed: {}".format(course_url, e))
+            summary["status"] = "failed: {}".format(e)
+            return summary
+
+        try:
+            download = Download(course_url=course_url, session=session, pool=pool, profile=profile,
+                                crawl_only=crawl_only)
+            summary["name"] = download.course_info["course_name"]
+            summary["files"] = len(download.files)
+            summary["pages"] = download.stats["pages"]
+        except (Exception, SystemExit) as e:
+            logging.exception("Course {} failed".format(course_url))
+            summary["status"] = "failed: {}".format(str(e) or type(e).__name__)
+
+        summary["seconds"] = round(time.time() - start, 1)
+
+        return summary
+
+    completed = False
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="course") as executor:
+            summaries = list(executor.map(course, courses))
+        completed = True
+    finally:
+        print("Waiting for downloads to finish..." if completed else "Stopping downloads...")
+        finish(pool, cancel=not completed)
+
+    return summaries
+
+
+def fetch(files: [dict], username: str, password: str):
+    """
+    Downloads a list of files, in the given order, outside of a course crawl.
+    :param files: Entries with the url, folder and file_name of every file.
+    """
+    downloader = Downloader()
+    downloader.session = SessionPool(username, password, size=1).acquire()
+
+    pool = Pool()
+    completed = False
+    try:
+        for file in files:
+            pool.submit(file["url"],
+                        Request.download,
+                        downloader=downloader,
+                        url=file["url"],
+                        folder=file["folder"],
+                        file_name=file["file_name"],
+                        checksum=Config.CHECKSUM_FILES)
+        completed = True
+    finally:
+        finish(pool, cancel=not completed)
+
+
+def retry(username: str, password: str) -> []:
+    """
+    Retries every download in the failed queue.
+    :return: The downloads that still fail.
+    """
+    entries = failed.list()
+    print("Retrying {} failed downloads...".format(len(entries)))
+
+    fetch(entries, username, password)
+
+    remaining = failed.list()
+    print("{} of {} downloads still fail, see {}".format(len(remaining), len(entries), Config.FAILED_FILE))
+
+    return remaining
+
+
+def credentials(parser: argparse.ArgumentParser) -> (str, str):
+    username = os.environ.get("BBGEMIST_USERNAME")
+    password = os.environ.get("BBGEMIST_PASSWORD")
+    if not Config.OFFLINE and (not username or not password):
+        parser.error("BBGEMIST_USERNAME and BBGEMIST_PASSWORD must be set")
+
+    return username, password
+
+
+def retry_failed(arguments: [str]):
+    parser = argparse.ArgumentParser(prog="BBGemist retry",
+                                     description="Retry the downloads in the failed queue. Credentials are read from "
+                                                 "the BBGEMIST_USERNAME and BBGEMIST_PASSWORD environment variables.")
+    parser.parse_args(arguments)
+
+    retry(*credentials(parser))
+
+
+def main(arguments: [str]):
+    parser = argparse.ArgumentParser(prog="BBGemist batch",
+                                     description="Download many courses without prompts. Credentials are read from "
+                                                 "the BBGEMIST_USERNAME and BBGEMIST_PASSWORD environment variables.")
+    parser.add_argument("courses", nargs="+", help="course links, or files with one course link per line")
+    parser.add_argument("--workers", type=int, default=Config.BATCH_COURSES, help="courses downloaded at once")
+    parser.add_argument("--profile", choices=list(Config.PROFILES), default=Config.PROFILE,
+                        help="parts of the courses to crawl")
+    args = parser.parse_args(arguments)
+
+    username, password = credentials(parser)
+
+    courses = read_courses(args.courses)
+
+    start = time.time()
+    summaries = run(courses, username, password, workers=args.workers, profile=args.profile)
+
+    print()
+    print("Summary")
+    print("=======")
+    for summary in summaries:
+        print("{} : {} ({} pages, {} files, {} s) {}".format(summary["status"],
+                                                            summary["name"] or summary["course"],
+                                                            summary["pages"],
+                                                            summary["files"],
+                                                            summary.get("seconds", 0),
+                                                            summary["course"]))
+    print()
+    print("{} of {} courses done in {} s".format(len([summary for summary in summaries if summary["status"] == "done"]),
+                                                 len(summaries),
+                                                 round(time.time() - start, 1)))
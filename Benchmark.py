@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import Config
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+"""
+Benchmark of the crawl and download paths against a local stand-in for the Blackboard endpoints used by Download.
+
+The generated course has `menus` menu folders. Every content folder holds `files` attachments and, up to `depth`
+levels deep, `fanout` sub-folders. Every menu folder also has `assignments` assignments with an instruction file and
+a submitted file, which are linked from My Grades as well.
+"""
+
+COURSE_ID = "_1_1"
+
+
+class Course:
+    def __init__(self, menus: int = 3, depth: int = 2, fanout: int = 3, files: int = 3, assignments: int = 1,
+                 size: int = 256 * 1024):
+        self.menus = menus
+        self.depth = depth
+        self.fanout = fanout
+        self.files = files
+        self.assignments = assignments
+        self.size = size
+
+    @staticmethod
+    def page(body: str) -> str:
+        return "<html><head><title>Blackboard</title></head><body>{}</body></html>".format(body)
+
+    def login_page(self) -> str:
+        return self.page('<form><input type="hidden" name="blackboard.platform.security.NonceUtil.nonce" '
+                         'value="benchmark"></form>')
+
+    def course_page(self) -> str:
+        links = "".join('<li><a href="/webapps/blackboard/content/listContent.jsp?course_id={}&content_id={}">'
+                        '<span>Menu {}</span></a></li>'.format(COURSE_ID, index, index)
+                        for index in range(1, self.menus + 1))
+
+        return self.page('<a id="courseMenu_link">Benchmark Course</a>'
+                         '<ul id="courseMenuPalette_contents">{}</ul>'.format(links))
+
+    def content_page(self, content_id: str) -> str:
+        levels = content_id.split(".")
+
+        path = "".join("<li>{}</li>".format(self.folder_name(".".join(levels[:index + 1])))
+                       for index in range(len(levels)))
+
+        sections = []
+
+        if len(levels) <= self.depth:
+            for index in range(1, self.fanout + 1):
+                sub_id = "{}.{}".format(content_id, index)
+                sections.append('<li class="read"><img alt="Content Folder"><h3><a href="/webapps/blackboard/content/'
+                                'listContent.jsp?course_id={}&content_id={}">{}</a></h3></li>'
+                                .format(COURSE_ID, sub_id, self.folder_name(sub_id)))
+
+        if len(levels) == 1:
+            for index in range(1, self.assignments + 1):
+                assignment_id = "{}-{}".format(content_id, index)
+                sections.append('<li class="read"><img alt="Assignment"><h3><a href="/webapps/assignment/'
+                                'uploadAssignment?content_id={}&mode=view">Assignment {}</a></h3></li>'
+                                .format(assignment_id, assignment_id))
+
+        attachments = "".join('<li><a href="/bbcswebdav/pid-{0}/file_{0}_{1}.bin">file_{0}_{1}.bin</a>'
+                              '<span bb:menugeneratorurl="/a/b/c/d/e/file_{0}_{1}.bin?x=1">({2} bytes)</span></li>'
+                              .format(content_id, index, self.size) for index in range(1, self.files + 1))
+        sections.append('<li class="read"><img alt="File"><h3>Files</h3>'
+                        '<div class="details"><ul class="attachments">{}</ul></div></li>'.format(attachments))
+
+        return self.page('<div id="breadcrumbs"><ol class="path"><li>Benchmark Course</li>{}</ol></div>'
+                         '<ul id="content_listContainer">{}</ul>'.format(path, "".join(sections)))
+
+    @staticmethod
+    def folder_name(content_id: str) -> str:
+        if "." not in content_id:
+            return "Menu {}".format(content_id)
+
+        return "Folder {}".format(content_id)
+
+    def assignment_page(self, assignment_id: str) -> str:
+        return self.page('<div id="assignmentInfo"><ul><li><a href="/bbcswebdav/pid-{0}/instructions_{0}.bin">'
+                         'instructions_{0}.bin</a></li></ul></div>'
+                         '<a class="dwnldBtn" href="/webapps/assignment/download?course_id={1}&fileName='
+                         'submission_{0}.bin">Download</a>'.format(assignment_id, COURSE_ID))
+
+    def grades_page(self) -> str:
+        rows = "".join('<div class="row"><a onclick="loadContentFrame(\'/webapps/assignment/uploadAssignment?'
+                       'action=showHistory&content_id={0}-{1}\')">Assignment {0}-{1}</a></div>'
+                       .format(menu, index)
+                       for menu in range(1, self.menus + 1) for index in range(1, self.assignments + 1))
+
+        return self.page(rows)
+
+    def pages(self) -> int:
+        folders = sum(self.menus * self.fanout ** level for level in range(self.depth + 1))
+
+        return 3 + folders + self.menus * self.assignments + 1
+
+    def file_count(self) -> int:
+        folders = sum(self.menus * self.fanout ** level for level in range(self.depth + 1))
+
+        return folders * self.files + 2 * self.menus * self.assignments
+
+
+class Server(ThreadingHTTPServer):
+    """
+    Stand-in Blackboard server for a generated course. Counts the pages, files and bytes it serves.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, course: Course):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.course = course
+        self.stats = {"pages": 0, "files": 0, "bytes": 0, "logins": 0}
+        self.lock = threading.Lock()
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.stats[name] += value
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def html(self, body: str, cookie: str = None):
+        data = body.encode("utf-8")
+
+        self.server.count("pages")
+        self.send_response(200)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def file(self, name: str):
+        size = self.server.course.size
+        start = 0
+
+        if self.headers.get("If-None-Match") == '"{}"'.format(name):
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # a range of another version of the file is answered with the whole file #
+        if self.headers.get("Range", "").startswith("bytes=") and \
+                self.headers.get("If-Range", '"{}"'.format(name)) == '"{}"'.format(name):
+            start = int(self.headers["Range"][len("bytes="):].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, size - 1, size))
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size - start))
+        self.send_header("ETag", '"{}"'.format(name))
+        self.end_headers()
+
+        # content depends on the name, so the files do not deduplicate #
+        block = (name.encode("utf-8") * (65536 // len(name) + 1))[:65536]
+        remaining = size - start
+        while remaining > 0:
+            self.wfile.write(block[:min(remaining, len(block))])
+            remaining -= min(remaining, len(block))
+
+        self.server.count("files")
+        self.server.count("bytes", size - start)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.path.startswith("/webapps/login/"):
+            self.server.count("logins")
+            self.html(Course.page('<a href="/webapps/portal/execute/tabs/tabAction">Home</a>'),
+                      cookie="s_session_id=benchmark; Path=/")
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        course = self.server.course
+
+        if url.path == "/learn/api/public/v1/users/me":
+            if "s_session_id=benchmark" in self.headers.get("Cookie", ""):
+                self.send_response(200)
+            else:
+                self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif url.path == "/webapps/portal/execute/defaultTab":
+            self.html(course.login_page())
+        elif url.path == "/webapps/blackboard/execute/launcher":
+            self.html(course.course_page())
+        elif url.path == "/webapps/blackboard/content/listContent.jsp":
+            self.html(course.content_page(query["content_id"]))
+        elif url.path == "/webapps/assignment/uploadAssignment":
+            self.html(course.assignment_page(query["content_id"]))
+        elif url.path == "/webapps/bb-mygrades-bb_bb60/myGrades":
+            self.html(course.grades_page())
+        elif url.path.startswith("/bbcswebdav/"):
+            self.file(url.path.split("/")[-1])
+        elif url.path == "/webapps/assignment/download":
+            self.file(query["fileName"])
+        else:
+            self.send_error(404)
+
+
+def configure(path: str, base_url: str, rate: float):
+    """
+    Points every path in Config to a scratch folder and the host to the local server. Must run before the download
+    modules are imported, since they read Config when they are loaded.
+    """
+    old = Config.DOWNLOAD_PATH
+
+    for name in dir(Config):
+        value = getattr(Config, name)
+        if isinstance(value, str) and value.startswith(old):
+            setattr(Config, name, path + value[len(old):])
+        elif isinstance(value, dict):
+            setattr(Config, name, {key: path + item[len(old):] if isinstance(item, str) and item.startswith(old)
+                                   else item for key, item in value.items()})
+
+    Config.BASE_URL = base_url
+    Config.REQUEST_RATE = rate
+    Config.REQUEST_BURST = max(Config.REQUEST_BURST, int(rate))
+    Config.PROGRESS_MODE = "quiet"
+    Config.OFFLINE = False
+
+
+def peak_rss() -> float:
+    """
+    Returns the peak resident set size of this process in MB, or None where it cannot be measured.
+    """
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS #
+    return round(rss / 1024 / (1024 if os.uname().sysname == "Darwin" else 1), 1)
+
+
+def run(course: Course, rate: float = 1000, keep: bool = False, profile: str = "all") -> dict:
+    """
+    Downloads the generated course from a local server into a scratch folder.
+    :return: The measured rates and per-phase timings.
+    """
+    server = Server(course)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    path = tempfile.mkdtemp(prefix="bbgemist-benchmark-") + "/"
+    configure(path, server.url, rate)
+
+    import Session
+    from Download import Download
+
+    output = io.StringIO()
+    start = time.time()
+
+    with contextlib.redirect_stdout(output):
+        session = Session.create()
+        Session.login(session, "benchmark", "benchmark")
+        login = time.time() - start
+
+        download = Download(course_url=server.url + "/webapps/blackboard/execute/launcher?type=Course&id={}&url="
+                            .format(COURSE_ID), session=session, profile=profile)
+
+    total = time.time() - start
+
+    server.shutdown()
+    server.server_close()
+
+    if not keep:
+        shutil.rmtree(path, ignore_errors=True)
+
+    return {
+        "expected pages": course.pages(),
+        "expected files": course.file_count(),
+        "pages": server.stats["pages"],
+        "files": server.stats["files"],
+        "MB": round(server.stats["bytes"] / 1024 / 1024, 2),
+        "seconds": round(total, 2),
+        "pages/s": round(server.stats["pages"] / total, 1),
+        "files/s": round(server.stats["files"] / total, 1),
+        "MB/s": round(server.stats["bytes"] / 1024 / 1024 / total, 2),
+        "peak RSS MB": peak_rss(),
+        "crawl": download.stats,
+        "phases": {
+            "login": round(login, 3),
+            **{name: round(seconds, 3) for name, seconds in download.timings.items()}
+        },
+        "path": path if keep else None
+    }
+
+
+def main(arguments: [str]):
+    parser = argparse.ArgumentParser(prog="BBGemist benchmark",
+                                     description="Benchmark crawling and downloading against a local stand-in server.")
+    parser.add_argument("--menus", type=int, default=3, help="menu folders in the course")
+    parser.add_argument("--depth", type=int, default=2, help="levels of sub-folders below a menu folder")
+    parser.add_argument("--fanout", type=int, default=3, help="sub-folders per folder")
+    parser.add_argument("--files", type=int, default=3, help="attachments per folder")
+    parser.add_argument("--assignments", type=int, default=1, help="assignments per menu folder")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="size of every file in bytes")
+    parser.add_argument("--rate", type=float, default=1000, help="request rate of the pacer")
+    parser.add_argument("--keep", action="store_true", help="keep the downloaded course")
+    parser.add_argument("--profile", choices=list(Config.PROFILES), default="all", help="parts of the course to crawl")
+    args = parser.parse_args(arguments)
+
+    course = Course(menus=args.menus, depth=args.depth, fanout=args.fanout, files=args.files,
+                    assignments=args.assignments, size=args.size)
+
+    print(json.dumps(run(course, rate=args.rate, keep=args.keep, profile=args.profile), indent=4))
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1:])
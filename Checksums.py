@@ -0,0 +1,132 @@
+import logging
+import os
+import sqlite3
+import threading
+
+import Config
+import Utils
+
+
+class Checksums:
+    """
+    Index of the digests of every downloaded file in an SQLite database, keyed by path and algorithm, with the URL,
+    size and mtime of the file. Writes are buffered and committed in one transaction every `interval` changes.
+    The classic checksum files are only written on demand by export().
+    """
+
+    def __init__(self, file: str = Config.CHECKSUM_DATABASE, interval: int = 50):
+        self.file = file
+        self.interval = interval
+        self.connection = None
+        self.pending = {}
+        self.lock = threading.RLock()
+
+    def connect(self) -> sqlite3.Connection:
+        with self.lock:
+            if self.connection is None:
+                Utils.create_folder_if_not_exists(os.path.dirname(self.file))
+
+                self.connection = sqlite3.connect(self.file, check_same_thread=False)
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS checksums ("
+                                        "path TEXT NOT NULL, "
+                                        "algorithm TEXT NOT NULL, "
+                                        "digest TEXT NOT NULL, "
+                                        "url TEXT, "
+                                        "size INTEGER, "
+                                        "mtime REAL, "
+                                        "PRIMARY KEY (path, algorithm))")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS checksums_url ON checksums (url)")
+                self.connection.commit()
+
+            return self.connection
+
+    def add(self, path: str, url: str, digests: dict):
+        """
+        Records the digests of a downloaded file. Size and mtime are taken from the file on disk.
+        :param digests: The hex digest for every algorithm, e.g. {"sha256": "..."}.
+        """
+        stat = os.stat(path)
+
+        with self.lock:
+            for algorithm, digest in digests.items():
+                self.pending[(path, algorithm)] = (path, algorithm, digest, url, stat.st_size, stat.st_mtime)
+
+            if len(self.pending) >= self.interval:
+                self.save()
+
+    def get(self, path: str, algorithm: str = "sha256") -> dict:
+        """
+        Returns the entry of a file, or None when the file is not in the index.
+        """
+        with self.lock:
+            row = self.pending.get((path, algorithm))
+            if row is None:
+                row = self.connect().execute("SELECT path, algorithm, digest, url, size, mtime FROM checksums "
+                                             "WHERE path = ? AND algorithm = ?", (path, algorithm)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(("path", "algorithm", "digest", "url", "size", "mtime"), row))
+
+    def has(self, path: str, algorithm: str = "sha256") -> bool:
+        """
+        Whether the file is in the index and unchanged on disk since it was recorded.
+        """
+        entry = self.get(path, algorithm)
+        if entry is None or not os.path.isfile(path):
+            return False
+
+        stat = os.stat(path)
+
+        return stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]
+
+    def save(self):
+        with self.lock:
+            if not self.pending:
+                return
+
+            logging.debug("Saving {} checksums".format(len(self.pending)))
+
+            with self.connect() as connection:
+                connection.executemany("INSERT OR REPLACE INTO checksums (path, algorithm, digest, url, size, mtime) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)", list(self.pending.values()))
+
+            self.pending = {}
+
+    def export(self, files: dict = Config.CHECKSUM_FILES) -> int:
+        """
+        Writes the index as sha256sum compatible files.
+        :param files: The file to write for every algorithm.
+        :return: The number of lines written.
+        """
+        self.save()
+
+        count = 0
+
+        for algorithm, file in files.items():
+            rows = self.connect().execute("SELECT digest, path FROM checksums WHERE algorithm = ? ORDER BY path",
+                                          (algorithm,))
+
+            Utils.create_folder_if_not_exists(os.path.dirname(file))
+            with open(file + ".tmp", mode="w", encoding="utf-8", newline="") as f:
+                for digest, path in rows:
+                    f.write("{} *{}\r\n".format(digest, path.replace("/", "\\")))
+                    count += 1
+
+            os.replace(file + ".tmp", file)
+
+        return count
+
+
+checksums = Checksums()
+
+
+def main(arguments: [str]):
+    count = checksums.export()
+
+    for file in Config.CHECKSUM_FILES.values():
+        print("Checksums written to {}".format(file))
+
+    print("{} lines written".format(count))
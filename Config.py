@@ -1,13 +1,109 @@
 DOWNLOAD_PATH = "D:/Blackboard/"
 
+BASE_URL = "https://blackboard.utwente.nl"
+
 CACHE_PATH = DOWNLOAD_PATH + "(cache)/"
 
 LOG_FILE = CACHE_PATH + "log.txt"
 
 CHECKSUM_FILE = CACHE_PATH + "checksum.sha256"
 
+# digests computed while downloading, e.g. add "md5": CACHE_PATH + "checksum.md5"
+CHECKSUM_FILES = {"sha256": CHECKSUM_FILE}
+
+# index of the digests, CHECKSUM_FILES are exported from it with "python . checksums"
+CHECKSUM_DATABASE = CACHE_PATH + "checksums.sqlite"
+
+MANIFEST_FILE = CACHE_PATH + "manifest.json"
+
+PLAN_FILE = CACHE_PATH + "plan.json"
+
+VISITED_FILE = CACHE_PATH + "visited.json"
+
+FAILED_FILE = CACHE_PATH + "failed.json"
+
+METRICS_FILE = CACHE_PATH + "metrics.jsonl"
+
+METRICS_PROMETHEUS = CACHE_PATH + "metrics.prom"
+
+PAGE_CACHE_PATH = CACHE_PATH + "(pages)/"
+
+PAGE_PACK = PAGE_CACHE_PATH + "pages.pack"
+
+PAGE_INDEX = PAGE_CACHE_PATH + "pages.sqlite"
+
 COOKIE_PATH = CACHE_PATH + "(cookies)/"
 
+BLOB_PATH = CACHE_PATH + "(blobs)/"
+
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:65.0) Gecko/20100101 Firefox/65.0"
 
 CONSOLE_HEIGHT = 24
+
+HTML_PARSER = "lxml"
+
+WORKERS = 4
+
+WORKERS_PER_HOST = 4
+
+# downloads waiting or running at once, the crawl waits when this many are queued
+QUEUE_SIZE = 64
+
+CRAWL_WORKERS = 8
+
+# levels of folders below a menu folder that are crawled, None for no limit
+CRAWL_DEPTH = 16
+
+# parts of a course that are crawled, per profile; actions 1, 2 and 3 use "files", "submissions" and "all"
+PROFILES = {
+    "files": {"announcements": False, "assignments": False, "grades": False},
+    "submissions": {"announcements": False, "assignments": True, "grades": True},
+    "all": {"announcements": True, "assignments": True, "grades": True}
+}
+
+# profile of batch runs
+PROFILE = "all"
+
+DEDUPLICATE = True
+
+# write every course into one archive instead of separate files: None, "zip", "tar" or "tar.zst" (needs zstandard)
+ARCHIVE = None
+
+# finished files waiting to be written into an archive
+ARCHIVE_QUEUE = 16
+
+PAGE_TTL = 6 * 60 * 60
+
+# keep the course pages compressed in the page store instead of as separate html files
+PACK_PAGES = True
+
+OFFLINE = False
+
+PROGRESS_MODE = "auto"
+
+PROGRESS_RATE = 10
+
+BATCH_COURSES = 4
+
+# logged in sessions shared by the courses of a batch run, handed out in turn
+BATCH_SESSIONS = 2
+
+METRICS = True
+
+TIMEOUT = 60
+
+RETRIES = 5
+
+RETRY_BACKOFF = 1
+
+RETRY_BACKOFF_MAX = 60
+
+CHUNK_MIN = 64 * 1024
+
+CHUNK_MAX = 4 * 1024 * 1024
+
+PREALLOCATE = True
+
+REQUEST_RATE = 2
+
+REQUEST_BURST = 8
\ No newline at end of file
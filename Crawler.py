@@ -0,0 +1,31 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import Config
+
+
+class Crawler:
+    """
+    Fetches pages concurrently from a work frontier. A task is a tuple of a callable and its arguments; the callable
+    returns the follow-up tasks it discovered, which are added to the frontier.
+    """
+
+    def __init__(self, workers: int = Config.CRAWL_WORKERS):
+        self.workers = workers
+
+    def run(self, tasks: []):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as executor:
+            pending = {executor.submit(*task) for task in tasks}
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    try:
+                        children = future.result()
+                    except Exception as e:
+                        logging.exception("Crawl task failed: {}".format(e))
+                        continue
+
+                    for child in children or []:
+                        pending.add(executor.submit(*child))
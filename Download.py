@@ -1,89 +1,146 @@
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
 from getpass import getpass
-from urllib.parse import unquote
-
-import requests
+from urllib.parse import parse_qsl, urlparse
 
 import Config
+import Parser
 import Request
+import Session
 import Utils
+from Archive import archives
+from Checksums import checksums
+from Crawler import Crawler
 from Downloader import Downloader
+from Manifest import manifest
+from Metrics import metrics
+from PageStore import page_store
+from Pool import Pool
+from Progress import progress
+from Visited import normalize, visited
+
+
+def finish(pool: Pool, cancel: bool = False):
+    """
+    Waits for the downloads of the pool, then closes the archives and saves everything that is written in batches.
+    :param cancel: Drop the downloads that did not start yet, e.g. after Ctrl+C.
+    """
+    pool.shutdown(cancel)
+    archives.close()
+    progress.stop()
+    manifest.save()
+    checksums.save()
+    visited.save()
+    page_store.compact()
+    metrics.report()
 
 
 class Download(Downloader):
     username = None
     password = None
-    base_url = "https://blackboard.utwente.nl"
-
-    def __init__(self):
+    base_url = Config.BASE_URL
+
+    def __init__(self, course_url: str = None, session=None, pool: Pool = None, profile: str = Config.PROFILE,
+                 crawl_only: bool = False):
+        """
+        Downloads a course. Everything that is not given is asked for interactively.
+        :param course_url: The link to the course.
+        :param session: A logged in session, e.g. from a SessionPool.
+        :param pool: A download pool shared with other courses, the caller waits for it to finish.
+        :param profile: The parts of the course to crawl, see Config.PROFILES.
+        :param crawl_only: Only crawl and cache the pages, without downloading files, e.g. to plan a download.
+        """
         logging.debug("--- Initialising Downloader ---")
 
-        message = "Please login to Blackboard"
-        print(message)
-        print("=" * len(message))
-        print()
-
-        if self.username is None:
-            logging.debug('User will type username now...')
-            self.username = input("Please type your username and hit [Enter]:\n> ")
-            logging.debug("User typed username.")
-            print()
-        if self.password is None:
-            logging.debug("User will type password now...")
-            print("Please type your password (not visible) and hit [Enter]:\n")
-            self.password = getpass("> ")
-            logging.debug("User typed password.")
+        self.profile = Config.PROFILES[profile]
+        self.crawl_only = crawl_only
+        self.files = []
+        self.timings = {}
+        self.claimed = set()
+        self.seen = set()
+        self.stats = {"pages": 0, "new": 0, "duplicates": 0, "too deep": 0}
+        self.lock = threading.Lock()
+        self.pool = pool or Pool()
+
+        if session is not None:
+            self.session = session
+        else:
+            message = "Please login to Blackboard"
+            print(message)
+            print("=" * len(message))
             print()
 
-        message = "Logging in to Blackboard, please wait..."
-        print(message)
-        print()
-
-        self.session = requests.session()
+            if self.username is None:
+                logging.debug('User will type username now...')
+                self.username = input("Please type your username and hit [Enter]:\n> ")
+                logging.debug("User typed username.")
+                print()
 
-        self.files = []
+            self.session = Session.create()
+
+            if Config.OFFLINE:
+                print("Offline, using cached pages only.")
+            elif Session.resume(self.session, self.username):
+                print("Logged in with the saved session!")
+            else:
+                if self.password is None:
+                    logging.debug("User will type password now...")
+                    print("Please type your password (not visible) and hit [Enter]:\n")
+                    self.password = getpass("> ")
+                    logging.debug("User typed password.")
+                    print()
+
+                message = "Logging in to Blackboard, please wait..."
+                print(message)
+                print()
 
-        if self.login():
-            print("Logged in!")
-        else:
-            print("ERROR logging in...")
+                if self.login():
+                    Session.save(self.session, self.username)
+                    print("Logged in!")
+                else:
+                    print("ERROR logging in...")
 
-        Utils.clear()
+            Utils.clear()
 
-        course_url = input("Enter course link:\n")
-        print()
-        course_info = self.get_course_info(course_url)
-        print()
-
-        logging.debug(json.dumps(course_info, indent=4))
+        interactive = course_url is None
+        if interactive:
+            course_url = input("Enter course link:\n")
+            print()
 
-        input("Press [Enter] to start downloading the pages...")
+        start = time.time()
+        self.course_info = self.get_course_info(course_url)
+        self.timings["course"] = time.time() - start
         print()
 
-        course_pages = self.get_course_pages(course_info)
+        logging.debug(json.dumps(self.course_info, indent=4))
 
-        for course_page in course_pages:
-            self.parse_course_page(course_info, course_page)
+        if interactive:
+            input("Press [Enter] to start downloading the pages...")
+            print()
 
-        print("Done!")
+        start = time.time()
+        completed = False
+        try:
+            self.crawl(self.course_info)
+            self.timings["crawl"] = time.time() - start
+            completed = True
+        finally:
+            # also save what was done when the crawl is interrupted #
+            if pool is None:
+                print("Waiting for downloads to finish..." if completed else "Stopping downloads...")
+                start = time.time()
+                finish(self.pool, cancel=not completed)
+                self.timings["downloads"] = time.time() - start
+
+        if pool is None:
+            print("Done!")
 
     def login(self):
-        r = self.session.get('https://blackboard.utwente.nl/webapps/portal/execute/defaultTab')
-        soup = Utils.soup(string=r.text)
-        value = soup.find('input', attrs={'name': 'blackboard.platform.security.NonceUtil.nonce'})['value']
-        login_url = f'{self.base_url}/webapps/login/'
-        payload = {
-            'user_id': self.username,
-            'password': self.password,
-            'login': 'Login',
-            'action': 'login',
-            'new_loc': '',
-            'blackboard.platform.security.NonceUtil.nonce': value
-        }
-        r = self.session.post(login_url, data=payload)
-        return 'webapps/portal/execute/tabs' in r.text
+        return Session.login(self.session, self.username, self.password)
 
     def get_course_info(self, course_url):
         print("Getting Course Information...")
@@ -93,15 +150,15 @@ class Download(Downloader):
 
         logging.debug("Fetching course URL...")
 
-        self.headers["Referer"] = "https://blackboard.utwente.nl/"
-        self.headers["Host"] = "blackboard.utwente.nl"
+        self.headers["Referer"] = self.base_url + "/"
+        self.headers["Host"] = urlparse(self.base_url).netloc
 
-        r = self.session.get(course_url, headers=self.headers, allow_redirects=True)
+        html = Request.page(self.session, course_url, headers=self.headers, allow_redirects=True)
 
         logging.debug("Fetched course URL")
 
         logging.debug("Souping HTML...")
-        soup = Utils.soup(string=r.content)
+        soup = Utils.soup(string=html, only=Utils.COURSE_INDEX)
         logging.debug("Souped HTML")
 
         course_name = soup.select("#courseMenu_link")
@@ -126,7 +183,7 @@ class Download(Downloader):
         print()
 
         Utils.create_folder_if_not_exists(Config.CACHE_PATH + course_name)
-        Utils.write(Config.CACHE_PATH + course_name + "\\index.html", str(soup))
+        self.save_page(Config.CACHE_PATH + course_name + "\\index.html", html)
 
         print("Course folders:")
         folders = []
@@ -154,6 +211,9 @@ class Download(Downloader):
                 "tool_id=_178" # grades added manually
             ]
 
+            if not self.profile["announcements"]:
+                skip.append("Announcements")
+
             if not any(x in course_folder_url for x in skip) and not any(x in course_folder_name for x in skip):
                 folders.append({
                     "folder": course_folder_name,
@@ -162,10 +222,11 @@ class Download(Downloader):
 
         print()
 
-        folders.append({
-            "folder": "My Grades",
-            "url": "/webapps/bb-mygrades-bb_bb60/myGrades?course_id={}&stream_name=mygrades&is_stream=false".format(course_id)
-        })
+        if self.profile["grades"]:
+            folders.append({
+                "folder": "My Grades",
+                "url": "/webapps/bb-mygrades-bb_bb60/myGrades?course_id={}&stream_name=mygrades&is_stream=false".format(course_id)
+            })
 
         return {
             "course_url": course_url,
@@ -173,7 +234,7 @@ class Download(Downloader):
             "course_folders": folders
         }
 
-    def get_course_pages(self, course_info: dict):
+    def crawl(self, course_info: dict):
         if "course_folders" not in course_info.keys():
             logging.critical("Course folders missing in dict!")
             exit()
@@ -181,241 +242,236 @@ class Download(Downloader):
             logging.critical("Course folders empty!")
             exit()
 
-        course_pages = []
+        tasks = []
         for course_folder in course_info["course_folders"]:
-            logging.info("Getting Course Page...")
-            logging.info("Course Content Page: {}".format(course_folder["folder"]))
-            logging.info("Course Content URL : {}".format(course_folder["url"]))
-            logging.info("Course Name        : {}".format(course_info["course_name"]))
+            page = self.admit(course_info, self.base_url + course_folder["url"],
+                              Config.CACHE_PATH + course_info["course_name"] + "/" + course_folder["folder"] + ".html", 0)
+            if page:
+                tasks.append((self.get_course_page, course_info, course_folder, page))
+
+        Crawler().run(tasks)
+
+        print("Crawled {} pages ({} new), skipped {} duplicate and {} too deep links".format(self.stats["pages"],
+                                                                                          self.stats["new"],
+                                                                                          self.stats["duplicates"],
+                                                                                          self.stats["too deep"]))
+        logging.info("Crawl statistics of {}: {}".format(course_info["course_name"], self.stats))
+
+    def save_page(self, page: str, html: str):
+        """
+        Writes a page to the cache, and to the archive of the course when archiving.
+        """
+        if Config.PACK_PAGES:
+            page_store.put(page, html)
+        else:
+            Utils.create_file_if_not_exists(page)
+            Utils.write(page, html)
 
-            course_page_path = course_info["course_name"] + "/" + course_folder["folder"]
-            course_page_html = course_info["course_name"] + "/" + course_folder["folder"] + ".html"
-            logging.info("Course Content Path: {}".format(course_page_path))
-            logging.info("Course Content HTML: {}".format(course_page_html))
+        if Config.ARCHIVE:
+            archives.add_page(page, html)
 
-            # Save course content page to cache
-            print("Downloading Page: {}".format(course_page_path))
-            r = self.session.get("https://blackboard.utwente.nl" + course_folder["url"])
+    def remove_page(self, page: str):
+        if os.path.isfile(page):
+            os.remove(page)
 
-            Utils.create_file_if_not_exists(Config.CACHE_PATH + course_page_html)
-            Utils.write(Config.CACHE_PATH + course_page_html, r.text)
+        page_store.remove(page)
 
-            Utils.wait(seconds=5, variable=3, countdown=True)
+    def admit(self, course_info: dict, url: str, page: str, depth: int) -> str:
+        """
+        Decides whether a page is crawled. Every URL is crawled at most once per run, and never deeper than CRAWL_DEPTH,
+        so pages linked from several places or in a cycle are fetched once. A page whose cache file is already taken by
+        another URL, e.g. a sibling folder with the same name, gets the content id of its URL added to the cache file.
+        :return: The cache file of the page, or None when it is not crawled.
+        """
+        if Config.CRAWL_DEPTH is not None and depth > Config.CRAWL_DEPTH:
+            logging.warning("Not crawling {}, deeper than {} levels".format(url, Config.CRAWL_DEPTH))
+            with self.lock:
+                self.stats["too deep"] += 1
+            return None
 
-            course_pages.append(Config.CACHE_PATH + course_page_html)
+        with self.lock:
+            key = normalize(url)
 
-        return course_pages
+            if key in self.seen:
+                self.stats["duplicates"] += 1
+                return None
 
-    def parse_course_page(self, course_info, course_page):
-        if "Announcements" in course_page:
-            pass
+            self.seen.add(key)
 
-        elif "Grades" in course_page:
-            self.parse_grades(course_page, course_info["course_name"])
+            if page in self.claimed:
+                stem, extension = os.path.splitext(page)
+                digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
 
-        else:
-            soup = Utils.soup(file=course_page)
+                page = "{}_{}{}".format(stem, dict(parse_qsl(urlparse(key).query)).get("content_id", digest), extension)
+                if page in self.claimed:
+                    page = "{}_{}{}".format(stem, digest, extension)
 
-            folder_path = []
-            path = soup.select("#breadcrumbs")[0].select(".path")[0].find_all("li")[1:]
-            for path_item in path:
-                if path_item.text.strip() != "":
-                    folder_path.append(path_item.text.strip())
-                    print(path_item.text.strip())
-                    logging.debug(path_item.text.strip())
+            self.claimed.add(page)
 
-            folder = course_info["course_name"] + "/" + "/".join(folder_path) + "/"
+            status = visited.visit(url, course_info["course_name"], page, depth)
 
-            print()
+            self.stats["pages"] += 1
+            if status == "new":
+                self.stats["new"] += 1
 
-            if len(soup.select("#content_listContainer")) == 0:
-                input("There is no content on this page?")
+            return page
 
-                return
+    def get_course_page(self, course_info: dict, course_folder: dict, course_page: str):
+        logging.info("Getting Course Page...")
+        logging.info("Course Content Page: {}".format(course_folder["folder"]))
+        logging.info("Course Content URL : {}".format(course_folder["url"]))
+        logging.info("Course Name        : {}".format(course_info["course_name"]))
 
-            sections = soup.select("#content_listContainer")[0].select(".read")
-            print("Number of sections: {}".format(len(sections)))
-            for section in sections:
-                print("Section Title: {}".format(section.find("h3").text.strip()))
+        course_page_path = course_info["course_name"] + "/" + course_folder["folder"]
+        logging.info("Course Content Path: {}".format(course_page_path))
+        logging.info("Course Content HTML: {}".format(course_page))
 
-                # Determine Section Type
-                image = section.find("img")
-                if len(image) > 0:
-                    if image.get("alt") is not None:
-                        section_type = image.get("alt")  # No other way to get type... Bad bad Blackboard...
+        # Save course content page to cache
+        print("Downloading Page: {}".format(course_page_path))
+        html = Request.page(self.session, self.base_url + course_folder["url"], "menu")
 
-                        if section_type == "Content Folder":
-                            # input("A sub-folder was found! Press [Enter] to download this folder...")
+        self.save_page(course_page, html)
 
-                            folder_url = "https://blackboard.utwente.nl" + section.find("h3").find("a").get("href")
-                            folder_name = section.find("h3").text.strip().replace("/", "&").replace("\\", "&")
+        return self.parse_course_page(course_info, course_page, 0)
 
-                            print("Folder URL: {}".format(folder_url))
-                            print("Folder Name: {}".format(folder_name))
+    def get_folder_page(self, course_info: dict, folder_url: str, folder_page: str, depth: int):
+        html = Request.page(self.session, folder_url)
 
-                            r = self.session.get(folder_url)
+        self.save_page(folder_page, html)
 
-                            Utils.create_file_if_not_exists(Config.CACHE_PATH + folder + folder_name + ".html")
-                            Utils.write(Config.CACHE_PATH + folder + folder_name + ".html", r.text)
+        return self.parse_course_page(course_info, folder_page, depth)
 
-                            self.parse_course_page(course_info, Config.CACHE_PATH + folder + folder_name + ".html")
+    def get_assignment_page(self, course_info: dict, assignment_url: str, assignment_name: str, assignment_page: str):
+        print("Writing submission info page: {}".format(assignment_page))
+        html = Request.page(self.session, assignment_url)
 
-                        elif section_type == "Assignment":
-                            # input("An assignment was found! Press [Enter] to download this assignment...")
+        self.save_page(assignment_page, html)
 
-                            assignment_url = "https://blackboard.utwente.nl" + section.find("h3").find("a").get("href")
-                            assignment_name = section.find("h3").text.strip().replace("/", "&").replace("\\", "&")
+        self.parse_submission(assignment_page, course_info["course_name"], assignment_name)
 
-                            file_name = course_info["course_name"] + "\\[Assignments]\\" + assignment_name + ".html"
-                            file_name = Config.CACHE_PATH + "".join(i for i in file_name if i not in ':*?"<>|')
+        return []
 
-                            print("Writing submission info page: {}".format(file_name))
-                            r = self.session.get(assignment_url)
+    def parse_course_page(self, course_info, course_page, depth) -> []:
+        """
+        Parses a cached course page, queues its attachments for download and returns the crawl tasks for the
+        sub-folders and assignments found on it.
+        """
+        tasks = []
 
-                            Utils.create_file_if_not_exists(file_name)
-                            Utils.write(file_name, r.text)
+        if "Announcements" in course_page:
+            pass
 
-                            self.parse_submission(file_name, course_info["course_name"], assignment_name)
+        elif "Grades" in course_page:
+            tasks += self.parse_grades(course_info, course_page, depth)
 
-                        else:
+        else:
+            page = Parser.course_page(Utils.read(course_page), course_info["course_name"])
 
+            print(" / ".join(page["path"]))
+            logging.debug(page["folder"])
 
-                            print("Something else...")
+            if not page["content"]:
+                print("There is no content on this page: {}".format(course_page))
 
+                return tasks
 
-                    else:
-                        logging.error("No alt text for image")
-                else:
-                    logging.critical("Could not determine section type")
-
-                # Get Files for Section
-                attachments = section.select(".attachments")
-                if len(attachments) > 0:
-                    attachments_files = attachments[0].find_all("li")
-                    if len(attachments_files) > 0:
-                        if len(attachments_files) > 2:
-                            print("Discovered {} files".format(len(attachments_files) / 2))
-                        else:
-                            print("Discovered {} file".format(len(attachments_files) / 2))
-
-                        for attachments_file in attachments_files:
-                            file_url = "https://blackboard.utwente.nl" + attachments_file.find("a").get("href")
-                            file_name = attachments_file.find("a").text.strip()
-                            if file_name == "":
-                                continue
-                            if len(file_name.split(".")) == 1:
-                                file_name = file_name + " - " + unquote(attachments_file.find("span").get("bb:menugeneratorurl").split("/")[6].split("?")[0])
-                            file_size = attachments_file.find("span").text.strip()
-
-                            self.files.append({
-                                "folder": folder,
-                                "file_url": file_url,
-                                "file_name": file_name,
-                                "file_size": file_size,
-                            })
-
-                            print("- " + attachments_file.find("a").text.strip())
-                            logging.info("File URL: {}".format(file_url))
-                            logging.info("File Name: {}".format(file_name))
-                            logging.info("File Size: {}".format(file_size))
-
-                            # print("\nPress enter to download")
-                            # input()
-                            Utils.wait(1)
-
-                            print("Downloading File...")
-                            Utils.info("Course", course_info["course_name"])
-                            Utils.info("Folder", folder.replace(course_info["course_name"], ""))
-                            download = self.download_file(url=file_url,
-                                                          folder=folder,
-                                                          file_name=file_name)
+            for folder in page["folders"]:
+                print("Folder: {}".format(folder["name"]))
+                logging.info("Folder URL: {}".format(folder["url"]))
 
-                print()
+                folder_page = self.admit(course_info, folder["url"], folder["page"], depth + 1)
+                if folder_page:
+                    tasks.append((self.get_folder_page, course_info, folder["url"], folder_page, depth + 1))
+
+            for assignment in page["assignments"] if self.profile["assignments"] else []:
+                print("Assignment: {}".format(assignment["name"]))
+                logging.info("Assignment URL: {}".format(assignment["url"]))
+
+                assignment_page = self.admit(course_info, assignment["url"], assignment["page"], depth + 1)
+                if assignment_page:
+                    tasks.append((self.get_assignment_page,
+                                  course_info,
+                                  assignment["url"],
+                                  assignment["name"],
+                                  assignment_page))
+
+            for file in page["files"]:
+                self.files.append(file)
+
+                print("- " + file["file_name"])
+                logging.info("File URL: {}".format(file["file_url"]))
+                logging.info("File Name: {}".format(file["file_name"]))
+                logging.info("File Size: {}".format(file["file_size"]))
+
+                download = self.download_file(url=file["file_url"],
+                                              folder=file["folder"],
+                                              file_name=file["file_name"])
+
+            print()
+
+        return tasks
 
     def download_file(self, url, folder, file_name):
-        download = Request.download(downloader=self,
+        if Config.OFFLINE or self.crawl_only:
+            logging.info("Crawling only, skipping download of {}".format(url))
+            return None
+
+        download = self.pool.submit(url,
+                                    Request.download,
+                                    downloader=self,
                                     url=url,
                                     folder=folder,
                                     file_name=file_name,
-                                    checksum=Config.CHECKSUM_FILE)
+                                    checksum=Config.CHECKSUM_FILES)
 
         return download
 
-    def parse_grades(self, grades_file, folder):
+    def parse_grades(self, course_info, grades_file, depth) -> []:
+        """
+        Parses the cached grades page and returns the crawl tasks for the submission pages that are not downloaded yet,
+        so they are fetched concurrently with the rest of the crawl.
+        """
         print("Parsing Grades")
-        soup = Utils.soup(grades_file)
+        submissions = Parser.grades(Utils.read(grades_file), course_info["course_name"])
 
-        submissions = soup.find_all("div", {"class": "row"})
+        tasks = []
 
         for submission in submissions:
-            if len(submission.find_all("a")) > 0 and "uploadAssignment?action=showHistory" in submission.find_all("a")[0].get("onclick"):
-                url = self.base_url + submission.find("a").get("onclick").split("('")[1].split("')")[0]
-                name = submission.find("a").text
-
-                file_name = folder + "\\[Assignments]\\" + name + ".html"
-                file_name = Config.CACHE_PATH + "".join(i for i in file_name if i not in ':*?"<>|')
-
-                print("Writing submission info page: {}".format(file_name))
-                r = self.session.get(url)
-
-                if os.path.isfile(file_name):
-                    print("Submission already downloaded!")
-                else:
-                    Utils.create_file_if_not_exists(file_name)
-                    Utils.write(file_name, r.text)
+            # also linked from its content page, already fetched in this or an earlier run #
+            if Utils.exists(submission["page"]) or submission["page"] in self.claimed:
+                print("Submission already downloaded!")
+                continue
 
-                    self.parse_submission(file_name, folder, name)
+            submission_page = self.admit(course_info, submission["url"], submission["page"], depth + 1)
+            if submission_page:
+                tasks.append((self.get_assignment_page,
+                              course_info,
+                              submission["url"],
+                              submission["name"],
+                              submission_page))
 
-                Utils.wait(3)
+        return tasks
 
     def parse_submission(self, submission_page, folder, name):
         print("Parsing Submission")
-        soup = Utils.soup(submission_page)
+        submission = Parser.submission(Utils.read(submission_page), folder, name)
 
-        if "Browse Local Files. Opens the File Upload window to upload files from your computer." in str(soup):
+        if submission["kind"] == "upload":
             print("This is a submission page! Deleting html!")
-            os.remove(submission_page)
+            self.remove_page(submission_page)
 
             return
 
-        if "You are or were enrolled in more than one group for this assignment." in str(soup):
+        if submission["kind"] == "group":
             print("This is a group submission page! Deleting html and ignoring!")
-            os.remove(submission_page)
+            self.remove_page(submission_page)
 
             return
 
-        assignment_files = soup.find("div", {"id": "assignmentInfo"})
-
-        assignment_files = assignment_files.find("ul")
-        if assignment_files is not None:
-            print("Found {} assignment files".format(len(assignment_files.find_all("a"))))
-
-            assignment_files = assignment_files.find_all("a")
-
-            # input("Press [Enter] to download assignment files...")
-
-            for assignment_file in assignment_files:
-                filename = unquote(assignment_file.text)
-                url = assignment_file.get("href")
-
-                download = self.download_file(url=self.base_url + url,
-                                              folder=folder + "/[Assignments]/" + name + "/",
-                                              file_name="[Assignment] " + filename)
-
-                Utils.wait(3)
-
-        submission_files = soup.find_all("a", {"class": "dwnldBtn"})
-
-        print("Found {} submitted files".format(len(submission_files)))
+        print("Found {} assignment and submitted files".format(len(submission["files"])))
         print()
-        # input("Press [Enter] to download submission files...")
-
-        for submission_file in submission_files:
-            filename = unquote(submission_file.get("href").split("=")[-1])
-            url = submission_file.get("href")
-
-            download = self.download_file(url=self.base_url + url,
-                                          folder=folder + "/[Assignments]/" + name + "/",
-                                          file_name=filename)
 
-            Utils.wait(3)
+        for file in submission["files"]:
+            download = self.download_file(url=file["file_url"],
+                                          folder=file["folder"],
+                                          file_name=file["file_name"])
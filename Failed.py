@@ -0,0 +1,56 @@
+import os
+import threading
+
+import Config
+import Utils
+
+
+class Failed:
+    """
+    Persistent queue of downloads that kept failing after all retries, so they can be retried as a batch later.
+    Entries are keyed by URL and folder and hold the arguments of Request.download.
+    """
+
+    def __init__(self, file: str = Config.FAILED_FILE):
+        self.file = file
+        self.entries = None
+        self.lock = threading.RLock()
+
+    def load(self) -> dict:
+        with self.lock:
+            if self.entries is None:
+                if os.path.isfile(self.file):
+                    self.entries = {entry["url"] + " " + entry["folder"]: entry for entry in Utils.data(file=self.file)}
+                else:
+                    self.entries = {}
+
+            return self.entries
+
+    def add(self, url: str, folder: str, file_name: str, error: str):
+        with self.lock:
+            self.load()[url + " " + folder] = {
+                "url": url,
+                "folder": folder,
+                "file_name": file_name,
+                "error": error,
+                "time": Utils.date()
+            }
+            self.save()
+
+    def remove(self, url: str, folder: str):
+        with self.lock:
+            if self.load().pop(url + " " + folder, None) is not None:
+                self.save()
+
+    def list(self) -> []:
+        with self.lock:
+            return list(self.load().values())
+
+    def save(self):
+        with self.lock:
+            Utils.create_folder_if_not_exists(os.path.dirname(self.file))
+            Utils.write(self.file + ".tmp", list(self.entries.values()))
+            os.replace(self.file + ".tmp", self.file)
+
+
+failed = Failed()
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+import Config
+import Utils
+
+
+class Manifest:
+    """
+    Persistent record of every downloaded URL with its local path, size, validators (ETag / Last-Modified) and
+    digests, so a re-run can ask the server whether a file changed instead of downloading it again.
+    """
+
+    def __init__(self, file: str = Config.MANIFEST_FILE, interval: int = 50):
+        self.file = file
+        self.interval = interval
+        self.entries = None
+        self.changes = 0
+        self.lock = threading.RLock()
+
+    def load(self) -> dict:
+        with self.lock:
+            if self.entries is None:
+                if os.path.isfile(self.file):
+                    self.entries = Utils.data(file=self.file)
+                else:
+                    self.entries = {}
+
+            return self.entries
+
+    def get(self, url: str) -> dict:
+        with self.lock:
+            return self.load().get(url)
+
+    def set(self, url: str, entry: dict):
+        """
+        Records a downloaded URL. The manifest is written to disk every `interval` changes.
+        """
+        with self.lock:
+            self.load()[url] = entry
+            self.changes += 1
+
+            if self.changes >= self.interval:
+                self.save()
+
+    def save(self):
+        with self.lock:
+            if self.entries is None or self.changes == 0:
+                return
+
+            logging.debug("Saving manifest with {} entries".format(len(self.entries)))
+
+            Utils.create_folder_if_not_exists(os.path.dirname(self.file))
+            Utils.write(self.file + ".tmp", self.entries)
+            os.replace(self.file + ".tmp", self.file)
+
+            self.changes = 0
+
+
+manifest = Manifest()
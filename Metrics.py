@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+
+import Config
+import Utils
+
+
+def classify(url: str) -> str:
+    """
+    Returns the kind of Blackboard URL, used to group the metrics.
+    """
+    if "/webapps/login" in url or "/webapps/portal/execute/defaultTab" in url:
+        return "login"
+    elif "/bbcswebdav/" in url or "/webapps/assignment/download" in url:
+        return "attachment"
+    elif "uploadAssignment" in url:
+        return "assignment"
+    elif "myGrades" in url:
+        return "grades"
+    elif "listContent.jsp" in url:
+        return "folder"
+    else:
+        return "course"
+
+
+class Metrics:
+    """
+    Records every HTTP request as a JSON line under CACHE_PATH and keeps per-kind totals for the end-of-run summary
+    and the optional Prometheus snapshot.
+    """
+
+    def __init__(self, file: str = Config.METRICS_FILE):
+        self.file = file
+        self.stream = None
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, method: str, url: str, kind: str = None, status=None, latency: float = 0, ttfb: float = 0,
+               size: int = 0, retries: int = 0):
+        """
+        Records one request.
+        :param kind: The kind of URL, see classify(); derived from the URL when not given.
+        :param status: The HTTP status code, or the exception name when the request failed.
+        :param latency: Seconds until the whole response was read.
+        :param ttfb: Seconds until the response headers arrived.
+        :param size: Bytes of the response body.
+        :param retries: Attempts before this one.
+        """
+        kind = kind or classify(url)
+
+        entry = {
+            "time": round(time.time(), 3),
+            "method": method,
+            "url": url,
+            "kind": kind,
+            "status": status,
+            "latency": round(latency, 4),
+            "ttfb": round(ttfb, 4),
+            "bytes": size,
+            "retries": retries
+        }
+
+        with self.lock:
+            totals = self.totals.setdefault(kind, {"requests": 0, "errors": 0, "bytes": 0, "latency": 0, "ttfb": 0,
+                                                   "retries": 0})
+            totals["requests"] += 1
+            totals["errors"] += 0 if isinstance(status, int) and status < 400 else 1
+            totals["bytes"] += size
+            totals["latency"] += latency
+            totals["ttfb"] += ttfb
+            totals["retries"] += retries
+
+            if not Config.METRICS:
+                return
+
+            if self.stream is None:
+                Utils.create_file_if_not_exists(self.file)
+                self.stream = open(self.file, mode="a", encoding="utf-8")
+
+            self.stream.write(json.dumps(entry) + "\n")
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {kind: dict(totals) for kind, totals in self.totals.items()}
+
+    def prometheus(self) -> str:
+        """
+        Returns the totals in the Prometheus text format.
+        """
+        lines = []
+
+        for name, key in [("bbgemist_requests_total", "requests"),
+                          ("bbgemist_request_errors_total", "errors"),
+                          ("bbgemist_response_bytes_total", "bytes"),
+                          ("bbgemist_request_seconds_total", "latency"),
+                          ("bbgemist_first_byte_seconds_total", "ttfb"),
+                          ("bbgemist_retries_total", "retries")]:
+            lines.append("# TYPE {} counter".format(name))
+
+            for kind, totals in sorted(self.summary().items()):
+                lines.append('{}{{kind="{}"}} {}'.format(name, kind, round(totals[key], 4)))
+
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """
+        Prints the summary, writes the Prometheus snapshot when configured and flushes the JSON lines.
+        """
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+        summary = self.summary()
+        if not summary:
+            return
+
+        print()
+        print("{:12} {:>8} {:>7} {:>10} {:>12} {:>12}".format("Kind", "Requests", "Errors", "MB", "Avg latency",
+                                                               "Avg TTFB"))
+        for kind, totals in sorted(summary.items()):
+            print("{:12} {:>8} {:>7} {:>10.2f} {:>11.3f}s {:>11.3f}s".format(kind,
+                                                                             totals["requests"],
+                                                                             totals["errors"],
+                                                                             totals["bytes"] / 1024 / 1024,
+                                                                             totals["latency"] / totals["requests"],
+                                                                             totals["ttfb"] / totals["requests"]))
+        print()
+
+        if Config.METRICS_PROMETHEUS:
+            Utils.write(Config.METRICS_PROMETHEUS, self.prometheus())
+
+
+metrics = Metrics()
@@ -0,0 +1,39 @@
+import threading
+import time
+
+import Config
+
+
+class Pacer:
+    """
+    Token bucket that limits the request rate over all threads. Tokens refill at `rate` per second up to `burst`, so
+    requests only wait once the budget is used up.
+    """
+
+    def __init__(self, rate: float = Config.REQUEST_RATE, burst: int = Config.REQUEST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+
+
+pacer = Pacer()
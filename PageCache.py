@@ -0,0 +1,41 @@
+import time
+
+import Config
+from PageStore import page_store
+
+
+class PageCache:
+    """
+    Cache of fetched Blackboard pages keyed by URL. Every page is stored with its validators and fetch time, so it can
+    be served while fresh, revalidated when stale, or served without network access in offline mode. The pages are
+    kept compressed in the page store.
+    """
+
+    def __init__(self, ttl: int = Config.PAGE_TTL):
+        self.ttl = ttl
+
+    def meta(self, url: str) -> dict:
+        """
+        Returns the stored metadata of a page, or None when the page is not cached.
+        """
+        return page_store.meta(url)
+
+    def fresh(self, meta: dict) -> bool:
+        return meta is not None and time.time() - meta["fetched"] < self.ttl
+
+    def read(self, url: str) -> str:
+        return page_store.get(url)
+
+    def store(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        page_store.put(url, text, {"url": url, "etag": etag, "last_modified": last_modified, "fetched": time.time()})
+
+    def touch(self, url: str, meta: dict):
+        """
+        Marks a cached page as fetched now, after it was stored or revalidated.
+        """
+        meta["fetched"] = time.time()
+
+        page_store.set_meta(url, meta)
+
+
+cache = PageCache()
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+
+import Config
+
+
+class PageStore:
+    """
+    Packed, compressed store of the Blackboard pages. Pages are compressed with zlib and a dictionary taken from the
+    first stored page, since all pages share most of their markup, and appended to one pack file. An SQLite index maps
+    every key, a URL or a cache path, to the record of its content, so identical pages are stored once.
+    """
+
+    def __init__(self, file: str = Config.PAGE_PACK, index: str = Config.PAGE_INDEX):
+        self.file = file
+        self.index = index
+        self.connection = None
+        self.pack = None
+        self.pid = None
+        self.dictionary = None
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def key(key: str) -> str:
+        # cache paths are written with both / and \ as separator #
+        return key.replace("\\", "/")
+
+    def connect(self) -> sqlite3.Connection:
+        with self.lock:
+            # worker processes of an offline re-parse open their own connection #
+            if self.connection is None or self.pid != os.getpid():
+                os.makedirs(os.path.dirname(self.file), exist_ok=True)
+
+                self.connection = sqlite3.connect(self.index, check_same_thread=False)
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS records ("
+                                        "digest TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL)")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS keys ("
+                                        "key TEXT PRIMARY KEY, digest TEXT NOT NULL, meta TEXT)")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value BLOB)")
+                self.connection.commit()
+
+                self.pack = open(self.file, mode="a+b")
+                self.pid = os.getpid()
+
+                row = self.connection.execute("SELECT value FROM settings WHERE name = 'dictionary'").fetchone()
+                self.dictionary = row[0] if row else None
+
+            return self.connection
+
+    def compress(self, data: bytes) -> bytes:
+        if self.dictionary is None:
+            self.dictionary = data[:32 * 1024]
+            self.connection.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('dictionary', ?)",
+                                    (self.dictionary,))
+
+        compressor = zlib.compressobj(level=6, zdict=self.dictionary)
+
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def put(self, key: str, text: str, meta: dict = None):
+        """
+        Stores a page under a key, replacing the page the key pointed to before.
+        :param meta: Data kept with the key, e.g. the validators of a URL.
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()
+
+        with self.lock:
+            connection = self.connect()
+
+            if connection.execute("SELECT 1 FROM records WHERE digest = ?", (digest,)).fetchone() is None:
+                record = self.compress(data)
+
+                self.pack.seek(0, os.SEEK_END)
+                offset = self.pack.tell()
+                self.pack.write(record)
+                self.pack.flush()
+
+                connection.execute("INSERT INTO records (digest, offset, length) VALUES (?, ?, ?)",
+                                   (digest, offset, len(record)))
+
+            connection.execute("INSERT OR REPLACE INTO keys (key, digest, meta) VALUES (?, ?, ?)",
+                               (self.key(key), digest, json.dumps(meta) if meta is not None else None))
+            connection.commit()
+
+    def get(self, key: str) -> str:
+        """
+        Returns the page stored under a key, or None.
+        """
+        with self.lock:
+            row = self.connect().execute("SELECT records.offset, records.length FROM keys "
+                                         "JOIN records ON records.digest = keys.digest WHERE keys.key = ?",
+                                         (self.key(key),)).fetchone()
+            if row is None:
+                return None
+
+            self.pack.seek(row[0])
+            data = self.pack.read(row[1])
+
+        return self.decompress(data).decode("utf-8")
+
+    def has(self, key: str) -> bool:
+        with self.lock:
+            return self.connect().execute("SELECT 1 FROM keys WHERE key = ?", (self.key(key),)).fetchone() is not None
+
+    def meta(self, key: str) -> dict:
+        with self.lock:
+            row = self.connect().execute("SELECT meta FROM keys WHERE key = ?", (self.key(key),)).fetchone()
+
+        return json.loads(row[0]) if row and row[0] else None
+
+    def set_meta(self, key: str, meta: dict):
+        with self.lock:
+            self.connect().execute("UPDATE keys SET meta = ? WHERE key = ?", (json.dumps(meta), self.key(key)))
+            self.connection.commit()
+
+    def remove(self, key: str):
+        with self.lock:
+            self.connect().execute("DELETE FROM keys WHERE key = ?", (self.key(key),))
+            self.connection.commit()
+
+    def keys(self, prefix: str) -> [str]:
+        """
+        Returns the keys starting with a prefix, e.g. the cache paths of the pages below a folder.
+        """
+        prefix = self.key(prefix)
+
+        with self.lock:
+            rows = self.connect().execute("SELECT key FROM keys WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+            return [row[0] for row in rows]
+
+    def compact(self):
+        """
+        Rewrites the pack without the pages no key points to anymore, once they take more space than the live pages.
+        """
+        with self.lock:
+            connection = self.connect()
+
+            connection.execute("DELETE FROM records WHERE digest NOT IN (SELECT digest FROM keys)")
+            live = connection.execute("SELECT COALESCE(SUM(length), 0) FROM records").fetchone()[0]
+            size = os.path.getsize(self.file)
+
+            if size - live < max(live, 1024 * 1024):
+                connection.commit()
+                return
+
+            logging.info("Compacting page store from {} to {} bytes".format(size, live))
+
+            with open(self.file + ".tmp", mode="wb") as target:
+                for digest, offset, length in connection.execute("SELECT digest, offset, length FROM records "
+                                                                 "ORDER BY offset").fetchall():
+                    self.pack.seek(offset)
+                    connection.execute("UPDATE records SET offset = ? WHERE digest = ?", (target.tell(), digest))
+                    target.write(self.pack.read(length))
+
+            self.pack.close()
+            os.replace(self.file + ".tmp", self.file)
+            self.pack = open(self.file, mode="a+b")
+
+            connection.commit()
+
+
+page_store = PageStore()
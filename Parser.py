@@ -0,0 +1,160 @@
+import logging
+from urllib.parse import unquote
+
+import Config
+import Utils
+
+"""
+Extraction of Blackboard pages. These functions only look at HTML and never fetch anything, so they can run on cached
+pages in other processes.
+"""
+
+
+def clean(name: str) -> str:
+    return name.replace("/", "&").replace("\\", "&")
+
+
+def cache_file(file_name: str) -> str:
+    return Config.CACHE_PATH + "".join(i for i in file_name if i not in ':*?"<>|')
+
+
+def course_page(html: str, course_name: str) -> dict:
+    """
+    Extracts the folder, sub-folders, assignments and attachments of a course content page.
+    :param html: The HTML of the page.
+    :param course_name: The name of the course the page belongs to.
+    :return: The folder path, the lists "folders", "assignments" and "files", and "content" which is False when the
+    page has no content list.
+    """
+    soup = Utils.soup(string=html, only=Utils.COURSE_PAGE)
+
+    folder_path = []
+    path = soup.select("#breadcrumbs")[0].select(".path")[0].find_all("li")[1:]
+    for path_item in path:
+        if path_item.text.strip() != "":
+            folder_path.append(path_item.text.strip())
+
+    folder = course_name + "/" + "/".join(folder_path) + "/"
+
+    page = {
+        "folder": folder,
+        "path": folder_path,
+        "content": len(soup.select("#content_listContainer")) > 0,
+        "folders": [],
+        "assignments": [],
+        "files": []
+    }
+
+    if not page["content"]:
+        return page
+
+    sections = soup.select("#content_listContainer")[0].select(".read")
+    for section in sections:
+        # Determine Section Type
+        image = section.find("img")
+        if image is not None:
+            if image.get("alt") is not None:
+                section_type = image.get("alt")  # No other way to get type... Bad bad Blackboard...
+
+                if section_type == "Content Folder":
+                    folder_name = clean(section.find("h3").text.strip())
+
+                    page["folders"].append({
+                        "url": Config.BASE_URL + section.find("h3").find("a").get("href"),
+                        "name": folder_name,
+                        "page": Config.CACHE_PATH + folder + folder_name + ".html"
+                    })
+
+                elif section_type == "Assignment":
+                    assignment_name = clean(section.find("h3").text.strip())
+
+                    page["assignments"].append({
+                        "url": Config.BASE_URL + section.find("h3").find("a").get("href"),
+                        "name": assignment_name,
+                        "page": cache_file(course_name + "\\[Assignments]\\" + assignment_name + ".html")
+                    })
+
+            else:
+                logging.error("No alt text for image")
+        else:
+            logging.critical("Could not determine section type")
+
+        # Get Files for Section
+        attachments = section.select(".attachments")
+        if len(attachments) > 0:
+            for attachments_file in attachments[0].find_all("li"):
+                file_name = attachments_file.find("a").text.strip()
+                if file_name == "":
+                    continue
+                if len(file_name.split(".")) == 1:
+                    file_name = file_name + " - " + unquote(attachments_file.find("span").get("bb:menugeneratorurl").split("/")[6].split("?")[0])
+
+                page["files"].append({
+                    "folder": folder,
+                    "file_url": Config.BASE_URL + attachments_file.find("a").get("href"),
+                    "file_name": file_name,
+                    "file_size": attachments_file.find("span").text.strip(),
+                })
+
+    return page
+
+
+def grades(html: str, course_name: str) -> []:
+    """
+    Extracts the submission history pages linked from the My Grades page.
+    :return: The URL, name and cache file of every submission page.
+    """
+    soup = Utils.soup(string=html, only=Utils.GRADES)
+
+    submissions = []
+
+    for submission in soup.find_all("div", {"class": "row"}):
+        links = submission.find_all("a")
+        if len(links) > 0 and "uploadAssignment?action=showHistory" in (links[0].get("onclick") or ""):
+            name = links[0].text
+
+            submissions.append({
+                "url": Config.BASE_URL + links[0].get("onclick").split("('")[1].split("')")[0],
+                "name": name,
+                "page": cache_file(course_name + "\\[Assignments]\\" + name + ".html")
+            })
+
+    return submissions
+
+
+def submission(html: str, course_name: str, name: str) -> dict:
+    """
+    Extracts the assignment and submitted files of an assignment page.
+    :return: The "kind" of page, "upload" and "group" pages are not downloaded, and the "files" on it.
+    """
+    if "Browse Local Files. Opens the File Upload window to upload files from your computer." in html:
+        return {"kind": "upload", "files": []}
+
+    if "You are or were enrolled in more than one group for this assignment." in html:
+        return {"kind": "group", "files": []}
+
+    soup = Utils.soup(string=html)
+
+    folder = course_name + "/[Assignments]/" + name + "/"
+    files = []
+
+    assignment_info = soup.find("div", {"id": "assignmentInfo"})
+    assignment_files = assignment_info.find("ul") if assignment_info is not None else None
+    if assignment_files is not None:
+        for assignment_file in assignment_files.find_all("a"):
+            files.append({
+                "folder": folder,
+                "file_url": Config.BASE_URL + assignment_file.get("href"),
+                "file_name": "[Assignment] " + unquote(assignment_file.text),
+                "file_size": None
+            })
+
+    for submission_file in soup.find_all("a", {"class": "dwnldBtn"}):
+        files.append({
+            "folder": folder,
+            "file_url": Config.BASE_URL + submission_file.get("href"),
+            "file_name": unquote(submission_file.get("href").split("=")[-1]),
+            "file_size": None
+        })
+
+    return {"kind": "submission", "files": files}
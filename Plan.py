@@ -0,0 +1,256 @@
+import argparse
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import Config
+import Parser
+import Store
+import Utils
+from Manifest import manifest
+from PageStore import page_store
+
+# cache folders that do not hold course pages #
+SKIP = ["(pages)", "(blobs)", "(cookies)"]
+
+UNITS = {"b": 1, "byte": 1, "bytes": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+
+
+def pages(path: str = Config.CACHE_PATH) -> []:
+    """
+    Finds the cached course pages, as files and in the page store. Pages are saved with both / and \\ as separators,
+    so the path relative to the cache is normalised before it is classified.
+    :return: A (kind, file, course name, name) tuple for every course, folder and assignment page.
+    """
+    found = []
+
+    for root, folders, files in os.walk(path):
+        folders[:] = [folder for folder in folders if folder not in SKIP]
+
+        for file in files:
+            classify(found, os.path.join(root, file),
+                     os.path.relpath(os.path.join(root, file), path).replace("\\", "/").split("/"))
+
+    # pages in the page store, without a file #
+    for key in page_store.keys(path):
+        if not os.path.isfile(key):
+            classify(found, key, key[len(page_store.key(path)):].split("/"))
+
+    return found
+
+
+def classify(found: [], file: str, parts: [str]):
+    """
+    Adds a cached page to the found pages when it is a course, folder or assignment page.
+    :param parts: The path of the page relative to the cache.
+    """
+    name = parts[-1][:-len(".html")]
+
+    if not parts[-1].endswith(".html") or len(parts) < 2 or parts[1:] == ["index.html"] or "Announcements" in parts[-1]:
+        return
+    elif parts[1] == "[Assignments]":
+        found.append(("submission", file, parts[0], name))
+    elif "Grades" in parts[-1]:
+        return
+    else:
+        found.append(("course", file, parts[0], name))
+
+
+def parse(page: tuple) -> []:
+    """
+    Parses one cached page in a worker process.
+    :return: The files on the page.
+    """
+    kind, file, course_name, name = page
+
+    try:
+        html = Utils.read(file)
+
+        if kind == "submission":
+            return Parser.submission(html, course_name, name)["files"]
+        else:
+            return Parser.course_page(html, course_name)["files"]
+    except Exception as e:
+        logging.error("Could not parse {}: {}".format(file, e))
+        return []
+
+
+def build(path: str = Config.CACHE_PATH, workers: int = None) -> []:
+    """
+    Builds the download plan from the cached pages without network access, parsing the pages on all CPU cores.
+    :return: Every file to download, without duplicates.
+    """
+    found = pages(path)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(parse, found, chunksize=max(1, len(found) // (4 * (os.cpu_count() or 1))))
+
+        plan = {}
+        for files in results:
+            for file in files:
+                plan.setdefault((file["folder"], file["file_url"], file["file_name"]), file)
+
+    return list(plan.values())
+
+
+def size(text: str) -> int:
+    """
+    Parses a size as shown in the attachment listing, e.g. "(2.3 MB)" or "(512 bytes)".
+    :return: The size in bytes, or None when it is unknown.
+    """
+    match = re.search(r"([\d.,]+)\s*(tb|gb|mb|kb|bytes|byte|b)\b", text or "", re.IGNORECASE)
+    if match is None:
+        return None
+
+    number = match.group(1)
+    if "." in number or re.search(r",\d{3}$", number):
+        number = number.replace(",", "")
+    else:
+        number = number.replace(",", ".")
+
+    try:
+        return int(float(number) * UNITS[match.group(2).lower()])
+    except ValueError:
+        return None
+
+
+def downloaded(file: dict) -> bool:
+    """
+    Whether the file was downloaded before and is still there, as a file or as a blob in the store. A later download
+    only revalidates it.
+    """
+    entry = manifest.get(file["file_url"])
+    if entry is None:
+        return False
+
+    return os.path.isfile(entry["path"]) or Store.has(entry["digests"].get("sha256", ""))
+
+
+def schedule(plan: []) -> []:
+    """
+    Orders the plan largest first, so the big files start early and the small ones fill up the workers at the end
+    instead of one big file finishing alone. Files of unknown size go last.
+    """
+    return sorted(plan, key=lambda file: -1 if file.get("size") is None else file["size"], reverse=True)
+
+
+def throughput(file: str = Config.METRICS_FILE) -> float:
+    """
+    Measures the download speed of a single worker from the attachment requests in the metrics of earlier runs.
+    :return: Bytes per second, or None without measurements.
+    """
+    if not os.path.isfile(file):
+        return None
+
+    size, seconds = 0, 0
+
+    with open(file, mode="r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+
+            if entry["kind"] == "attachment" and entry["status"] in (200, 206) and entry["bytes"] > 0:
+                size += entry["bytes"]
+                seconds += entry["latency"]
+
+    return size / seconds if seconds > 0 else None
+
+
+def estimate(plan: [], speed: float, workers: int = Config.WORKERS) -> float:
+    """
+    Simulates the scheduled plan on the workers at the measured speed per worker.
+    :return: The expected seconds until the last file is done.
+    """
+    finish = [0.0] * workers
+
+    for file in schedule(plan):
+        heapq.heappush(finish, heapq.heappop(finish) + (file.get("size") or 0) / speed)
+
+    return max(finish)
+
+
+def free_space(path: str = Config.DOWNLOAD_PATH) -> int:
+    """
+    Returns the free bytes on the disk of the path, or of its nearest existing parent folder.
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+
+    return shutil.disk_usage(path).free
+
+
+def main(arguments: [str]):
+    parser = argparse.ArgumentParser(prog="BBGemist plan",
+                                     description="Build the download plan from the cached pages, estimate its size "
+                                                 "and duration, and optionally download it largest file first.")
+    parser.add_argument("path", nargs="?", default=Config.CACHE_PATH, help="cache folder with the course pages")
+    parser.add_argument("--crawl", nargs="+", metavar="COURSE",
+                        help="first crawl these course links, or files with one link per line, without downloading "
+                             "any file")
+    parser.add_argument("--download", action="store_true",
+                        help="download the plan, credentials are read from BBGEMIST_USERNAME and BBGEMIST_PASSWORD")
+    args = parser.parse_args(arguments)
+
+    if args.crawl or args.download:
+        import Batch
+
+        username, password = Batch.credentials(parser)
+
+    if args.crawl:
+        print("Crawling {} courses without downloading files...".format(len(args.crawl)))
+        Batch.run(Batch.read_courses(args.crawl), username, password, crawl_only=True)
+        print()
+
+    start = time.time()
+
+    print("Parsing cached pages in {}...".format(args.path))
+    plan = build(args.path)
+
+    for file in plan:
+        file["size"] = size(file["file_size"])
+        file["downloaded"] = downloaded(file)
+    plan = schedule(plan)
+
+    Utils.write(Config.PLAN_FILE, plan)
+
+    print("Found {} files in {} s".format(len(plan), round(time.time() - start, 1)))
+    print("Plan written to {}".format(Config.PLAN_FILE))
+    print()
+
+    # files already on disk only cost a revalidation, they count for neither the size nor the time #
+    remaining = [file for file in plan if not file["downloaded"]]
+    done = [file for file in plan if file["downloaded"]]
+
+    total = sum(file["size"] or 0 for file in remaining)
+    unknown = len([file for file in remaining if file["size"] is None])
+    free = free_space()
+
+    print("Downloaded    : {} files, {:.1f} MB".format(len(done),
+                                                     sum(file["size"] or 0 for file in done) / 1024 / 1024))
+    print("Expected size : {:.1f} MB in {} files, {} files of unknown size".format(total / 1024 / 1024, len(remaining),
+                                                                                 unknown))
+    print("Free space    : {:.1f} MB".format(free / 1024 / 1024))
+
+    speed = throughput()
+    if speed:
+        print("Expected time : {} s at {:.1f} MB/s per worker".format(round(estimate(remaining, speed), 1),
+                                                                       speed / 1024 / 1024))
+    else:
+        print("Expected time : unknown, no downloads measured yet")
+    print()
+
+    if total > free:
+        print("Not enough free space to download the plan")
+        return
+
+    if args.download:
+        Batch.fetch([{"url": file["file_url"], "folder": file["folder"], "file_name": file["file_name"]}
+                     for file in plan], username, password)
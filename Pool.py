@@ -0,0 +1,89 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import Config
+
+
+class Pool:
+    """
+    Runs download jobs on a fixed number of worker threads while the crawl keeps discovering files. At most `per_host`
+    jobs talk to the same host at a time, and at most `queue` jobs are waiting or running: submit() blocks when the
+    queue is full, so a huge course does not pile up jobs in memory faster than they are downloaded.
+    """
+
+    def __init__(self, workers: int = Config.WORKERS, per_host: int = Config.WORKERS_PER_HOST,
+                 queue: int = Config.QUEUE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download")
+        self.per_host = per_host
+        self.hosts = {}
+        self.slots = threading.BoundedSemaphore(max(queue, workers))
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+    def host(self, url: str) -> threading.BoundedSemaphore:
+        name = urlparse(url).netloc
+
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = threading.BoundedSemaphore(self.per_host)
+
+            return self.hosts[name]
+
+    def submit(self, url: str, method, /, *args, **kwargs):
+        """
+        Schedules `method(*args, **kwargs)` as a job for the host of `url` and returns its future. Waits for a free
+        slot when the queue is full.
+        :param url: The URL the job will fetch, used for the per-host limit.
+        :param method: The callable to run on a worker.
+        :return: The future of the job.
+        """
+        semaphore = self.host(url)
+
+        def job():
+            with semaphore:
+                return method(*args, **kwargs)
+
+        self.slots.acquire()
+
+        with self.lock:
+            self.pending += 1
+
+        future = self.executor.submit(job)
+        future.add_done_callback(self.done)
+
+        return future
+
+    def done(self, future):
+        try:
+            # jobs dropped by shutdown(cancel=True) have no exception to ask for #
+            if not future.cancelled() and future.exception() is not None:
+                logging.error("Download job failed: {}".format(future.exception()))
+        finally:
+            self.slots.release()
+
+            with self.lock:
+                self.pending -= 1
+                if self.pending == 0:
+                    self.idle.notify_all()
+
+    def join(self):
+        """
+        Waits until every submitted job, including jobs submitted while waiting, is done.
+        """
+        with self.lock:
+            while self.pending > 0:
+                self.idle.wait()
+
+    def shutdown(self, cancel: bool = False):
+        """
+        Waits for the jobs and stops the workers.
+        :param cancel: Drop the jobs that did not start yet and only wait for the running ones.
+        """
+        if cancel:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+        self.join()
+        self.executor.shutdown()
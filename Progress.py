@@ -0,0 +1,118 @@
+import json
+import shutil
+import sys
+import threading
+import time
+
+import Config
+
+
+def size(value: float) -> str:
+    for unit in ["B", "kB", "MB", "GB"]:
+        if value < 1024 or unit == "GB":
+            return "{:.1f} {}".format(value, unit)
+        value /= 1024
+
+
+class Progress:
+    """
+    Aggregated progress of all running downloads. The download loop only adds byte counts; a background thread redraws
+    at a fixed rate. Modes: "tty" draws a status line, "json" writes JSON lines, "quiet" draws nothing and "auto" picks
+    "tty" or "quiet" depending on whether stdout is a terminal.
+    """
+
+    def __init__(self, mode: str = Config.PROGRESS_MODE, rate: float = Config.PROGRESS_RATE):
+        if mode == "auto":
+            mode = "tty" if sys.stdout.isatty() else "quiet"
+
+        self.mode = mode
+        self.rate = rate
+        self.files = {}
+        self.finished = []
+        self.downloaded = 0
+        self.speed = 0
+        self.sample = (time.monotonic(), 0)
+        self.thread = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def begin(self, key: str, name: str, total: int = None, done: int = 0):
+        """
+        Registers a download. `total` is None when the server does not send a content length.
+        """
+        with self.lock:
+            self.files[key] = {"name": name, "done": done, "total": total}
+
+            if not self.running and self.mode != "quiet":
+                self.running = True
+                self.thread = threading.Thread(target=self.run, name="progress", daemon=True)
+                self.thread.start()
+
+    def update(self, key: str, count: int):
+        with self.lock:
+            self.files[key]["done"] += count
+            self.downloaded += count
+
+    def end(self, key: str, success: bool = True):
+        with self.lock:
+            file = self.files.pop(key, None)
+            if file is not None:
+                self.finished.append((file, success))
+
+    def run(self):
+        while self.running:
+            time.sleep(1 / self.rate)
+            self.draw()
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.thread.join()
+            self.draw()
+
+            if self.mode == "tty":
+                print()
+
+    def draw(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.sample[0]
+            if elapsed > 0:
+                # smoothed throughput over the last redraws #
+                self.speed = 0.8 * self.speed + 0.2 * (self.downloaded - self.sample[1]) / elapsed
+                self.sample = (now, self.downloaded)
+
+            remaining = sum(max(file["total"] - file["done"], 0) for file in self.files.values() if file["total"])
+            eta = remaining / self.speed if self.speed > 0 else None
+            files = [dict(file) for file in self.files.values()]
+            finished, self.finished = self.finished, []
+            downloaded = self.downloaded
+
+        if self.mode == "json":
+            for file, success in finished:
+                print(json.dumps({"event": "finished", "file": file["name"], "bytes": file["done"], "success": success}))
+            print(json.dumps({"event": "progress", "bytes": downloaded, "speed": round(self.speed),
+                              "eta": None if eta is None else round(eta), "files": files}), flush=True)
+
+        elif self.mode == "tty":
+            width = shutil.get_terminal_size((120, 24)).columns - 1
+
+            for file, success in finished:
+                line = "{} : {} ({})".format("Done  " if success else "Failed", file["name"], size(file["done"]))
+                print(line[:width].ljust(width))
+
+            active = []
+            for file in files:
+                if file["total"]:
+                    active.append("{} {:.0f}%".format(file["name"][:16], 100 * file["done"] / file["total"]))
+                else:
+                    active.append("{} {}".format(file["name"][:16], size(file["done"])))
+
+            line = "[{} | {}/s | ETA {}] {}".format(size(downloaded),
+                                                     size(self.speed),
+                                                     "--:--" if eta is None else "{:d}:{:02d}".format(*divmod(int(eta), 60)),
+                                                     " | ".join(active))
+            print(line[:width].ljust(width) + "\r", end="", flush=True)
+
+
+progress = Progress()
@@ -1,29 +1,205 @@
+import datetime
+import hashlib
+import logging
 import os
 import random
-
+import shutil
+import threading
 import time
+from email.utils import parsedate_to_datetime
+
+import requests
+import urllib3
 
 import Config
+import Store
 import Utils
+from Archive import archives
+from Checksums import checksums
+from Failed import failed
+from Manifest import manifest
+from Metrics import metrics
+from Pacer import pacer
+from PageCache import cache
+from Progress import progress
+
+# status codes worth another attempt #
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+# errors while reading a download worth another attempt, a part file is resumed; failing to connect at all is
+# already retried by request() #
+RETRY_ERRORS = (requests.exceptions.ChunkedEncodingError, urllib3.exceptions.ProtocolError,
+                urllib3.exceptions.ReadTimeoutError, ConnectionError, TimeoutError)
+
+# files currently being downloaded, so concurrent downloads never share a part file #
+active = set()
+lock = threading.Lock()
+
+
+def backoff(attempt: int) -> float:
+    """
+    Returns the jittered exponential delay before the next attempt.
+    """
+    return random.uniform(0, min(Config.RETRY_BACKOFF_MAX, Config.RETRY_BACKOFF * 2 ** attempt))
+
+
+def retry_after(r) -> float:
+    """
+    Returns the delay requested by the Retry-After header of a response, in seconds or as an HTTP date.
+    """
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def request(method, session, url, kind=None, **kwargs):
+    """
+    Sends a request with the session once the shared pacer allows it, and records it in the metrics. Streamed
+    responses are recorded by the caller once the body is read. Connection errors, timeouts, 5xx and 429 responses
+    are retried with a jittered exponential backoff, or after the delay given by Retry-After.
+    :param kind: The kind of URL for the metrics, derived from the URL when not given.
+    """
+    kwargs.setdefault("timeout", Config.TIMEOUT)
+
+    for attempt in range(Config.RETRIES + 1):
+        pacer.take()
+
+        start = time.monotonic()
+        try:
+            r = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.record(method, url, kind, type(e).__name__, time.monotonic() - start, retries=attempt)
+
+            if attempt == Config.RETRIES:
+                raise
+
+            delay = backoff(attempt)
+            reason = type(e).__name__
+        else:
+            if not kwargs.get("stream"):
+                metrics.record(method, url, kind, r.status_code, time.monotonic() - start, r.elapsed.total_seconds(),
+                               len(r.content), retries=attempt)
+
+            if r.status_code not in RETRY_STATUS or attempt == Config.RETRIES:
+                return r
+
+            r.close()
+            delay = retry_after(r) if r.status_code == 429 and retry_after(r) is not None else backoff(attempt)
+            reason = "HTTP {}".format(r.status_code)
 
-total_downloaded = 0
+        logging.warning("{} {} failed ({}), retrying in {:.1f} s".format(method, url, reason, delay))
+        time.sleep(delay)
+
+
+def get(session, url, kind=None, **kwargs):
+    """
+    Sends a GET request with the session once the shared pacer allows it.
+    """
+    return request("GET", session, url, kind, **kwargs)
+
+
+def post(session, url, kind=None, **kwargs):
+    """
+    Sends a POST request with the session once the shared pacer allows it.
+    """
+    return request("POST", session, url, kind, **kwargs)
+
+
+def page(session, url, kind=None, **kwargs) -> str:
+    """
+    Returns the HTML of a Blackboard page through the page cache. Fresh pages are served from the cache, stale pages
+    are revalidated, and in offline mode only the cache is used.
+    :param session: The logged in session.
+    :param url: The URL of the page.
+    :param kind: The kind of page for the metrics.
+    :return: The HTML of the page.
+    """
+    meta = cache.meta(url)
+
+    if meta is not None and (Config.OFFLINE or cache.fresh(meta)):
+        return cache.read(url)
+
+    if Config.OFFLINE:
+        raise FileNotFoundError("Page not in cache: {}".format(url))
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = get(session, url, kind, headers=headers, **kwargs)
+
+    if r.status_code == 304 and meta is not None:
+        cache.touch(url, meta)
+
+        return cache.read(url)
+
+    # never cache error pages or the login page of an expired session #
+    if r.status_code == 200 and "/webapps/login" not in r.url:
+        cache.store(url, r.text, etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+
+    return r.text
 
 
 def download(downloader, url, folder, file_name=None, referrer=None, cookie=None, checksum=None):
-    global total_downloaded
-    total_downloaded_mb = 0
+    """
+    Downloads a file, retrying interrupted transfers from where they stopped. A file that still fails after all
+    retries is added to the failed queue instead of stopping the run.
+    :return: The path of the file, or False when the download failed.
+    """
+    for attempt in range(Config.RETRIES + 1):
+        try:
+            path = transfer(downloader, url, folder, file_name, referrer, cookie, checksum)
+        except RETRY_ERRORS as e:
+            if attempt < Config.RETRIES:
+                delay = backoff(attempt)
+                logging.warning("Download of {} failed ({}), retrying in {:.1f} s".format(url, e, delay))
+                time.sleep(delay)
+                continue
+
+            error = e
+        except Exception as e:
+            error = e
+        else:
+            failed.remove(url, folder)
+
+            # unchanged files are already in the archive of an earlier run #
+            if Config.ARCHIVE and path and os.path.isfile(path):
+                archives.add_file(path)
+
+            return path
+
+        logging.error("Download of {} failed: {}".format(url, error))
+        failed.add(url, folder, file_name, "{}: {}".format(type(error).__name__, error))
+
+        return False
+
 
+def transfer(downloader, url, folder, file_name=None, referrer=None, cookie=None, checksum=None):
+    """
+    Makes one attempt at downloading a file, see download().
+    """
     # set headers #
     headers = {"User-Agent": Config.USER_AGENT}
     if cookie:
-        Utils.info("Cookie", cookie)
+        logging.info("Cookie: {}".format(cookie))
         headers["Cookie"] = cookie
     if referrer:
-        Utils.info("Refer", referrer)
+        logging.info("Referrer: {}".format(referrer))
         headers["Referer"] = referrer
 
-    # print info #
-    Utils.info("URL", url)
+    # log info #
+    logging.info("URL: {}".format(url))
 
     # filename #
     if file_name is None:
@@ -36,29 +212,150 @@ def download(downloader, url, folder, file_name=None, referrer=None, cookie=None
     # make folders #
     Utils.create_folder_if_not_exists(folder)
 
-    # add random string to file name if it already exists #
-    if os.path.isfile(folder + file_name):
-        file_name = file_name + "_" + "".join(random.choices("0123456789abcdef", k=8))
+    # known file, only download it again when it changed on the server #
+    entry = manifest.get(url)
+    if Config.ARCHIVE:
+        # archived files are no longer on disk, only the entry at the same place in the archive is kept #
+        if entry and not (entry["path"] == folder + file_name and archives.has(entry["path"])):
+            entry = None
+    elif entry and not (os.path.isfile(entry["path"]) or Store.has(entry["digests"].get("sha256", ""))):
+        entry = None
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
 
-    # print info
-    Utils.info("Folder", folder)
-    Utils.info("File", file_name)
+    # file on disk that the checksum index records for this URL, unchanged since it was downloaded #
+    if entry is None:
+        known = checksums.get(folder + file_name)
+        if known is not None and known["url"] == url and checksums.has(folder + file_name):
+            logging.info("Exists: {}".format(folder + file_name))
+            return folder + file_name
 
-    # fix long file names
-    if len(folder + file_name) > 254:
-        file_name = file_name[:32] + "_" + "".join(random.choices("0123456789abcdef", k=8)) + "." + file_name.split(".")[-1]
+    # add a string to file name if it already exists or is being downloaded by another worker, derived from the URL
+    # so a retry finds its part file again #
+    with lock:
+        original = folder + file_name
+        updating = entry is not None and entry["path"] == original
+        if (os.path.isfile(original) and not updating) or original in active:
+            file_name = file_name + "_" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+        if folder + file_name in active:
+            file_name = file_name + "_" + "".join(random.choices("0123456789abcdef", k=8))
+
+        # fix long file names, deterministic so an interrupted download finds its part file again #
+        if len(folder + file_name + ".part") > 254:
+            file_name = file_name[:32] + "_" + hashlib.sha1(file_name.encode("utf-8")).hexdigest()[:8] + "." + file_name.split(".")[-1]
+
+        target = folder + file_name
+        active.add(target)
+
+    # log info
+    logging.info("Folder: {}".format(folder))
+    logging.info("File: {}".format(file_name))
+
+    # download to a part file that is renamed once complete #
+    part = folder + file_name + ".part"
+
+    # resume from the bytes already on disk, only while the remote file is still the one the part file was
+    # started from #
+    offset = os.path.getsize(part) if os.path.isfile(part) else 0
+    validator = None
+    if offset > 0 and os.path.isfile(part + ".validator"):
+        with open(part + ".validator", mode="r", encoding="utf-8") as f:
+            validator = f.read().strip()
+    if offset > 0 and validator:
+        logging.info("Resume: {} bytes".format(offset))
+        headers["Range"] = "bytes={}-".format(offset)
+        headers["If-Range"] = validator
+    else:
+        offset = 0
+
+    # running digests, updated while streaming so the file is never read back #
+    if isinstance(checksum, str):
+        checksum = {"sha256": checksum}
+    digests = {name: hashlib.new(name) for name in checksum or {}}
+    # archived files leave the course folder, a blob would be a second copy #
+    deduplicate = Config.DEDUPLICATE and not Config.ARCHIVE
+    if deduplicate:
+        digests.setdefault("sha256", hashlib.sha256())
 
     # return False when Exception occurs #
+    success = False
+    r = None
+    recorded = False
+    size_downloaded = offset
+    start = time.monotonic()
     try:
-        # start download #
-        with open(folder + file_name, 'wb') as f:
-            start = time.time()
-            bar_width = 20
-            size_downloaded = 0
+        # get connection #
+        r = get(downloader.session, url, stream=True, headers=headers)
+        # r = requests.get(url, stream=True, headers=headers)
+
+        # unchanged on the server #
+        if r.status_code == 304:
+            r.close()
+            metrics.record("GET", url, "attachment", r.status_code, time.monotonic() - start, r.elapsed.total_seconds())
+            recorded = True
+            logging.info("Not modified: {}".format(url))
+
+            # saved here before, also under a name with a collision suffix #
+            if updating or entry["path"] == folder + file_name:
+                # deleted from the course folder since, restore it from the store, unless it is in the archive #
+                if not os.path.isfile(entry["path"]) and not Config.ARCHIVE:
+                    logging.info("Restoring: {}".format(entry["path"]))
+                    Store.link(Store.path(entry["digests"]["sha256"]), entry["path"])
+
+                return entry["path"]
+
+            # same URL in another folder, place the known content there #
+            if Store.has(entry["digests"].get("sha256", "")):
+                Store.link(Store.path(entry["digests"]["sha256"]), folder + file_name)
+            else:
+                shutil.copyfile(entry["path"], folder + file_name)
+
+            checksums.add(folder + file_name, url, {name: digest for name, digest in entry["digests"].items()
+                                                    if name in (checksum or {})})
+
+            return folder + file_name
+
+        # part file does not match the remote file anymore, start over #
+        if r.status_code == 416 and offset > 0:
+            r.close()
+            del headers["Range"]
+            del headers["If-Range"]
+            offset = 0
+            r = get(downloader.session, url, stream=True, headers=headers)
+
+        # never save error pages as files #
+        r.raise_for_status()
+
+        # server ignored the range or the file changed, start over #
+        if r.status_code != 206:
+            offset = 0
+
+        size_downloaded = offset
+
+        # remember what the part file is a prefix of, a strong ETag or else the modification date #
+        if offset == 0:
+            validator = r.headers.get("ETag")
+            if not validator or validator.startswith("W/"):
+                validator = r.headers.get("Last-Modified")
+
+            if validator:
+                Utils.write(part + ".validator", validator)
+            elif os.path.isfile(part + ".validator"):
+                os.remove(part + ".validator")
 
-            # get connection #
-            r = downloader.session.get(url, stream=True, headers=headers)
-            # r = requests.get(url, stream=True, headers=headers)
+        # only a resumed part file has to be hashed from disk #
+        if offset > 0 and digests:
+            with open(part, 'rb') as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    for digest in digests.values():
+                        digest.update(block)
+
+        # start download #
+        with open(part, 'r+b' if offset > 0 else 'wb') as f:
+            f.seek(offset)
 
             # get content size #
             size_total = r.headers.get('content-length')
@@ -67,75 +364,96 @@ def download(downloader, url, folder, file_name=None, referrer=None, cookie=None
             if size_total is None or size_total == "0":
                 size_total = 1
             else:
-                size_total = int(size_total)
-
-            Utils.info("Size", "{} bytes".format(size_total))
-
-            # write to file #
-            for chunk in r.iter_content(8192):
-                size_downloaded += len(chunk)
-                f.write(chunk)
-
-                # build progress bar #
-                if size_total == 1:
-                    progress = (size_downloaded // (1024 * 20) % bar_width) + 1
-                    done = " " * (progress - 1) + "*"
-                    todo = " " * (bar_width - progress)
-                    size_total = 1
-                    percentage = 100
-                    length = 7
-                else:
-                    progress = int(bar_width * size_downloaded / size_total)
-                    done = "=" * progress
-                    todo = " " * (bar_width - progress)
-                    percentage = (size_downloaded / size_total) * 100
-                    length = len(str(size_total))
-                    if len(done + todo) > bar_width:
-                        done = "=" * bar_width
-                        todo = ""
-                speed = round((size_downloaded / (time.time() - start)) / 1024, 1)
-                total_downloaded += len(chunk)
-                total_downloaded_mb = round(((total_downloaded / 1024) / 1024), 2)
-                print("[{}{}] : {:>{length}} / {} bytes [ {:6.2f}% | {} kB/s ] ({} MB) \r".format(done,
-                                                                                                  todo,
-                                                                                                  size_downloaded,
-                                                                                                  size_total,
-                                                                                                  percentage,
-                                                                                                  speed,
-                                                                                                  total_downloaded_mb,
-                                                                                                  length=length),
-                      end="")
-
-            if size_total == 1:
-                percentage = 100
-            else:
-                percentage = (size_downloaded / size_total) * 100
+                size_total = offset + int(size_total)
+
+            logging.info("Size: {} bytes".format(size_total))
+
+            progress.begin(target, file_name, None if size_total == 1 else size_total, offset)
 
-            print("[{}] : {} / {} bytes [ {:6.2f}% | {} ] ({} MB)".format("=" * bar_width,
-                                                                          size_downloaded,
-                                                                          size_total,
-                                                                          percentage,
-                                                                          "Done",
-                                                                          total_downloaded_mb),
-                  end=" " * bar_width + "\n\n")
+            # reserve the space up front, so large files are not fragmented #
+            if Config.PREALLOCATE and size_total > 1 and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(f.fileno(), offset, size_total - offset)
+                except OSError:
+                    pass
+
+            # write to file, growing the chunks while reads are fast and shrinking them on slow links #
+            chunk_size = Config.CHUNK_MIN
+            try:
+                while True:
+                    read_start = time.monotonic()
+                    chunk = r.raw.read(chunk_size, decode_content=True)
+                    if not chunk:
+                        break
+
+                    size_downloaded += len(chunk)
+                    f.write(chunk)
+                    for digest in digests.values():
+                        digest.update(chunk)
+                    progress.update(target, len(chunk))
+
+                    read_time = time.monotonic() - read_start
+                    if read_time < 0.25 and chunk_size < Config.CHUNK_MAX:
+                        chunk_size *= 2
+                    elif read_time > 1 and chunk_size > Config.CHUNK_MIN:
+                        chunk_size //= 2
+            finally:
+                # drop the preallocated tail, so a resume starts after the bytes actually written #
+                f.truncate(size_downloaded)
 
             f.close()
-    except Exception as e:
-        print("*** EXCEPTION ***")
-        print("The following exception occurred " + str(e) + "\n")
-        print("Do you want to continue? [y/n]")
-        while True:
-            confirm = input("> ")
-            if confirm == "y":
-                print("Continuing... Aborting download and returning False...")
-                return False
-            elif confirm == "n":
-                exit()
+
+        # keep the part file when the connection closed early #
+        if size_total != 1 and size_downloaded < size_total:
+            raise ConnectionError("Connection closed after {} of {} bytes".format(size_downloaded, size_total))
+
+        metrics.record("GET", url, "attachment", r.status_code, time.monotonic() - start, r.elapsed.total_seconds(),
+                       size_downloaded - offset)
+        recorded = True
+
+        if os.path.isfile(part + ".validator"):
+            os.remove(part + ".validator")
+
+        # store the content once and link it into the course folder #
+        exists = False
+        if deduplicate:
+            blob = Store.put(part, digests["sha256"].hexdigest())
+
+            # the same content is already saved under the original name #
+            exists = os.path.isfile(original) and os.path.samefile(original, blob)
+            if exists:
+                logging.info("Exists: {}".format(original))
+                file_name = original[len(folder):]
             else:
-                pass
+                Store.link(blob, folder + file_name)
+        else:
+            os.replace(part, folder + file_name)
+
+        manifest.set(url, {
+            "path": folder + file_name,
+            "size": size_downloaded,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "digests": {name: digest.hexdigest() for name, digest in digests.items()}
+        })
+
+        success = True
+
+        if exists:
+            return folder + file_name
+    except Exception as e:
+        if r is not None and not recorded:
+            metrics.record("GET", url, "attachment", type(e).__name__, time.monotonic() - start,
+                           r.elapsed.total_seconds(), size_downloaded - offset)
+
+        raise
+    finally:
+        progress.end(target, success)
+
+        with lock:
+            active.discard(target)
 
     # add to checksum #
-    if checksum:
-        Utils.add(checksum, Utils.get_hash(folder + file_name) + " *" + (folder + file_name).replace("/", "\\"))
+    checksums.add(folder + file_name, url, {name: digests[name].hexdigest() for name in checksum or {}})
 
     return folder + file_name
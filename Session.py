@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+
+import Config
+import Request
+import Utils
+
+
+def create() -> requests.Session:
+    """
+    Creates a session with a connection pool large enough for all crawl and download workers.
+    """
+    session = requests.session()
+
+    connections = Config.WORKERS + Config.CRAWL_WORKERS
+    adapter = requests.adapters.HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def login(session: requests.Session, username: str, password: str) -> bool:
+    """
+    Logs the session in to Blackboard.
+    :return: True when the login succeeded.
+    """
+    r = Request.get(session, Config.BASE_URL + '/webapps/portal/execute/defaultTab')
+    soup = Utils.soup(string=r.text, only=Utils.LOGIN)
+    value = soup.find('input', attrs={'name': 'blackboard.platform.security.NonceUtil.nonce'})['value']
+    login_url = f'{Config.BASE_URL}/webapps/login/'
+    payload = {
+        'user_id': username,
+        'password': password,
+        'login': 'Login',
+        'action': 'login',
+        'new_loc': '',
+        'blackboard.platform.security.NonceUtil.nonce': value
+    }
+    r = Request.post(session, login_url, data=payload)
+    return 'webapps/portal/execute/tabs' in r.text
+
+
+def cookie_file(username: str) -> str:
+    return Config.COOKIE_PATH + hashlib.sha1(username.encode("utf-8")).hexdigest() + ".json"
+
+
+def save(session: requests.Session, username: str):
+    """
+    Saves the cookies of a logged in session, readable by the current user only.
+    """
+    cookies = [{"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path,
+                "expires": cookie.expires, "secure": cookie.secure} for cookie in session.cookies]
+
+    Utils.create_folder_if_not_exists(Config.COOKIE_PATH)
+    os.chmod(Config.COOKIE_PATH, 0o700)
+
+    file = cookie_file(username)
+    descriptor = os.open(file + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, mode="w", encoding="utf-8") as f:
+        json.dump(cookies, f)
+    os.replace(file + ".tmp", file)
+
+
+def valid(session: requests.Session) -> bool:
+    """
+    Whether the session is logged in, checked with a small REST call instead of a portal page.
+    """
+    try:
+        r = Request.get(session, Config.BASE_URL + "/learn/api/public/v1/users/me", kind="login",
+                        allow_redirects=False)
+    except Exception as e:
+        logging.info("Session probe failed: {}".format(e))
+        return False
+
+    return r.status_code == 200
+
+
+def resume(session: requests.Session, username: str) -> bool:
+    """
+    Loads the saved cookies of the user into the session.
+    :return: True when the cookies are still logged in.
+    """
+    file = cookie_file(username)
+    if not os.path.isfile(file):
+        return False
+
+    try:
+        with open(file, mode="r", encoding="utf-8") as f:
+            cookies = json.load(f)
+    except ValueError:
+        return False
+
+    for cookie in cookies:
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                            expires=cookie["expires"], secure=cookie["secure"])
+
+    # drop cookies that expired since they were saved #
+    session.cookies.clear_expired_cookies()
+
+    if session.cookies and valid(session):
+        logging.info("Resumed session of {}".format(username))
+        return True
+
+    session.cookies.clear()
+
+    return False
+
+
+class SessionPool:
+    """
+    Pool of logged in sessions shared between workers. Sessions are created on demand, up to `size` sessions, and then
+    handed out in turn; like the crawl and download threads of one course, several courses use a session at once. New
+    sessions reuse the saved cookies and only log in when those expired.
+    """
+
+    def __init__(self, username: str, password: str, size: int = Config.BATCH_SESSIONS):
+        self.username = username
+        self.password = password
+        self.size = size
+        self.sessions = []
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> requests.Session:
+        with self.lock:
+            if len(self.sessions) >= self.size:
+                session = self.sessions[self.next % len(self.sessions)]
+                self.next += 1
+
+                return session
+
+            session = create()
+            if not (Config.OFFLINE or resume(session, self.username)):
+                if not login(session, self.username, self.password):
+                    raise PermissionError("Could not log in to Blackboard as {}".format(self.username))
+
+                save(session, self.username)
+
+            self.sessions.append(session)
+
+            return session
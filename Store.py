@@ -0,0 +1,57 @@
+import os
+import shutil
+import threading
+
+import Config
+import Utils
+
+lock = threading.Lock()
+
+
+def path(digest: str) -> str:
+    """
+    Returns the location of a blob in the content-addressed store.
+    :param digest: The SHA-256 hex digest of the content.
+    :return: The path of the blob.
+    """
+    return Config.BLOB_PATH + digest[:2] + "/" + digest
+
+
+def has(digest: str) -> bool:
+    return os.path.isfile(path(digest))
+
+
+def put(file: str, digest: str) -> str:
+    """
+    Moves a file into the store. When the content is already stored, the file is removed instead.
+    :param file: The file to store, it no longer exists afterwards.
+    :param digest: The SHA-256 hex digest of the file.
+    :return: The path of the blob.
+    """
+    blob = path(digest)
+
+    Utils.create_folder_if_not_exists(os.path.dirname(blob))
+
+    with lock:
+        if os.path.isfile(blob):
+            os.remove(file)
+        else:
+            os.replace(file, blob)
+
+    return blob
+
+
+def link(blob: str, file: str):
+    """
+    Places a stored blob at a path in the course tree as a hardlink, or as a copy when the file system does not
+    support hardlinks between the two locations.
+    :param blob: The path of the blob.
+    :param file: The path in the course tree.
+    """
+    if os.path.isfile(file):
+        os.remove(file)
+
+    try:
+        os.link(blob, file)
+    except OSError:
+        shutil.copyfile(blob, file)
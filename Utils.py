@@ -11,9 +11,23 @@ import time
 import math
 
 import re
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 import Config
+from PageStore import page_store
+
+try:
+    import lxml
+
+    PARSER = Config.HTML_PARSER
+except ImportError:
+    PARSER = "html.parser"
+
+# regions of the Blackboard pages that are actually used, see soup() #
+LOGIN = SoupStrainer("input", attrs={"name": "blackboard.platform.security.NonceUtil.nonce"})
+COURSE_INDEX = SoupStrainer(id=["courseMenu_link", "courseMenuPalette_contents"])
+COURSE_PAGE = SoupStrainer(id=["breadcrumbs", "content_listContainer"])
+GRADES = SoupStrainer("div", class_="row")
 
 
 def delete(file: str):
@@ -109,27 +123,57 @@ def create_folder_if_not_exists(path: str):
         pass
 
 
-def soup(file: str = None, string: str = None, errors=None):
+def soup(file: str = None, string: str = None, errors=None, only: SoupStrainer = None):
+    """
+    Parses HTML from a file or a string, with lxml when it is installed.
+    :param file: The HTML file to parse.
+    :param string: The HTML to parse.
+    :param errors: The decoding error handling for files.
+    :param only: Only parse the elements matching this strainer, e.g. COURSE_PAGE.
+    :return: The parsed HTML.
+    """
     if file and string:
         raise NotImplementedError
     elif file:
         # print("Loading HTML: {}".format(file))
         if os.path.isfile(file):
             if errors is not None:
-                html = BeautifulSoup(codecs.open(file, mode="r", encoding="utf-8", errors=errors), "html.parser")
+                html = BeautifulSoup(codecs.open(file, mode="r", encoding="utf-8", errors=errors), PARSER, parse_only=only)
             else:
-                html = BeautifulSoup(codecs.open(file, mode="r", encoding="utf-8"), "html.parser")
+                html = BeautifulSoup(codecs.open(file, mode="r", encoding="utf-8"), PARSER, parse_only=only)
         else:
-            raise FileNotFoundError("HTML file not found!")
+            html = BeautifulSoup(read(file), PARSER, parse_only=only)
     elif string:
         # print("Parsing HTML...")
-        html = BeautifulSoup(string, "html.parser")
+        html = BeautifulSoup(string, PARSER, parse_only=only)
     else:
         raise NotImplementedError
 
     return html
 
 
+def read(file: str) -> str:
+    """
+    Returns the content of a cached page, from its file or else from the page store.
+    """
+    if os.path.isfile(file):
+        with codecs.open(file, mode="r", encoding="utf-8") as f:
+            return f.read()
+
+    html = page_store.get(file)
+    if html is None:
+        raise FileNotFoundError("HTML file not found!")
+
+    return html
+
+
+def exists(file: str) -> bool:
+    """
+    Whether a cached page exists, as file or in the page store.
+    """
+    return os.path.isfile(file) or page_store.has(file)
+
+
 def data(file: str = None, string: str = None):
     if file and string:
         raise NotImplementedError
@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import Config
+import Utils
+
+
+def normalize(url: str) -> str:
+    """
+    Returns the canonical form of a page URL: lower case scheme and host, sorted query parameters and no fragment, so
+    the same page linked in different ways is only crawled once.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=False)))
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class Visited:
+    """
+    Index of the crawled pages by normalised URL, kept on disk with the course, cache file, depth and time of every
+    page, so a run can tell which pages are new. Which pages were already crawled in a run is kept by the run itself.
+    """
+
+    def __init__(self, file: str = Config.VISITED_FILE, interval: int = 100):
+        self.file = file
+        self.interval = interval
+        self.entries = None
+        self.changes = 0
+        self.lock = threading.RLock()
+
+    def load(self) -> dict:
+        with self.lock:
+            if self.entries is None:
+                if os.path.isfile(self.file):
+                    self.entries = Utils.data(file=self.file)
+                else:
+                    self.entries = {}
+
+            return self.entries
+
+    def visit(self, url: str, course: str, page: str, depth: int) -> str:
+        """
+        Records a crawled page.
+        :return: "new" for a page never crawled before and "known" for a page crawled in an earlier run.
+        """
+        key = normalize(url)
+
+        with self.lock:
+            status = "known" if key in self.load() else "new"
+
+            self.entries[key] = {
+                "course": course,
+                "page": page,
+                "depth": depth,
+                "time": round(time.time())
+            }
+            self.changes += 1
+
+            if self.changes >= self.interval:
+                self.save()
+
+            return status
+
+    def save(self):
+        with self.lock:
+            if self.entries is None or self.changes == 0:
+                return
+
+            logging.debug("Saving visited index with {} pages".format(len(self.entries)))
+
+            Utils.create_folder_if_not_exists(os.path.dirname(self.file))
+            Utils.write(self.file + ".tmp", self.entries)
+            os.replace(self.file + ".tmp", self.file)
+
+            self.changes = 0
+
+
+visited = Visited()
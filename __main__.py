@@ -1,4 +1,5 @@
 import logging
+import sys
 
 import Actions
 import Config
@@ -46,21 +47,40 @@ def main():
         Utils.page(lines)
 
 
-Utils.create_folder_if_not_exists(Config.CACHE_PATH)
-Utils.create_file_if_not_exists(Config.LOG_FILE)
+# guarded, worker processes import this module again #
+if __name__ == "__main__":
+    Utils.create_folder_if_not_exists(Config.CACHE_PATH)
+    Utils.create_file_if_not_exists(Config.LOG_FILE)
 
-logging.basicConfig(filename=Config.LOG_FILE,
-                    level=logging.DEBUG,
-                    format='%(asctime)s %(name)-22s %(levelname)-8s %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S'
-                    )
+    logging.basicConfig(filename=Config.LOG_FILE,
+                        level=logging.DEBUG,
+                        format='%(asctime)s %(name)-22s %(levelname)-8s %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S'
+                        )
 
-logging.info("======================")
-logging.info("=== Start BBGemist ===")
-logging.info("======================")
+    logging.info("======================")
+    logging.info("=== Start BBGemist ===")
+    logging.info("======================")
 
-logging.info('Start logging...')
+    logging.info('Start logging...')
 
-main()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import Batch
 
-logging.info('Exiting application...')
\ No newline at end of file
+        Batch.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "retry":
+        import Batch
+
+        Batch.retry_failed(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "plan":
+        import Plan
+
+        Plan.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "checksums":
+        import Checksums
+
+        Checksums.main(sys.argv[2:])
+    else:
+        main()
+
+    logging.info('Exiting application...')
\ No newline at end of file
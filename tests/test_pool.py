@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Pool import Pool
+
+
+class PoolTest(unittest.TestCase):
+    def test_cancel_with_queued_jobs(self):
+        pool = Pool(workers=1, per_host=1, queue=5)
+        started = threading.Event()
+        release = threading.Event()
+
+        def job():
+            started.set()
+            release.wait(5)
+
+        for _ in range(5):
+            pool.submit("http://example.com/", job)
+        started.wait(5)
+
+        stopper = threading.Thread(target=pool.shutdown, kwargs={"cancel": True}, daemon=True)
+        stopper.start()
+        time.sleep(0.1)
+        release.set()
+        stopper.join(5)
+
+        self.assertFalse(stopper.is_alive())
+        self.assertEqual(pool.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()